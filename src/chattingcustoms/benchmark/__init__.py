@@ -0,0 +1 @@
+"""Offline benchmarks that run the chatbots against a local fake OpenAI server"""
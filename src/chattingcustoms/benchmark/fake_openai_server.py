@@ -0,0 +1,300 @@
+"""
+Local stand-in for the OpenAI API used by the benchmarks.
+
+Serves /v1/chat/completions (plain and SSE streaming) and /v1/embeddings with
+configurable latency and jitter. Outputs depend only on the request, so runs
+are repeatable:
+
+- the trader categorizer gets 'Self Service Trader' or 'Expert Trader'
+- the combined triage prompt gets that category plus a "no threat" verdict as JSON
+- the threat assessment prompt gets a "no threat" JSON verdict
+- everything else gets a fixed-length reply derived from the prompt
+- embeddings are hashed bag-of-words vectors, so similar texts stay similar
+
+Run standalone with:
+    python -m benchmark.fake_openai_server --port 8765 --latency-ms 300
+and point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+@dataclass
+class FakeServerConfig:
+    latency_ms: float = 200.0          # base latency added to every request
+    jitter_ms: float = 50.0            # uniform +/- jitter on top of the latency
+    seed: int = 42                     # seeds the jitter; outputs never depend on it
+    reply_words: int = 120             # length of generic chat replies
+    stream_chunk_words: int = 4        # words per SSE chunk
+    stream_chunk_delay_ms: float = 5.0  # delay between SSE chunks
+    embedding_dimensions: int = 1536
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _count_tokens(text: str) -> int:
+    # Rough OpenAI-like estimate: ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+def _generic_reply(prompt: str, words: int) -> str:
+    vocabulary = [
+        "customs", "declaration", "permit", "import", "export", "Singapore", "goods", "trader",
+        "rule", "validation", "document", "clearance", "tariff", "item", "cart", "purchase",
+    ]
+    digest = _digest(prompt)
+    return " ".join(vocabulary[digest[i % len(digest)] % len(vocabulary)] for i in range(words))
+
+
+def chat_reply(messages: List[dict], config: FakeServerConfig) -> str:
+    """Deterministic assistant reply for the given chat messages."""
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+    if "trader_category" in system and "threat_category" in system:
+        category = "Expert Trader" if _digest(user)[0] % 2 else "Self Service Trader"
+        return json.dumps({"trader_category": category, "threat_category": "None", "threat_category_value": "None"})
+    if "Categorize the query" in system:
+        return "Expert Trader" if _digest(user)[0] % 2 else "Self Service Trader"
+    if "chattingcustoms" in system and "threat_category" in system:
+        return json.dumps({"chattingcustoms": {"threat_category": "None", "threat_category_value": "None"}})
+    return _generic_reply(system + user, config.reply_words)
+
+
+def embed_text(text, dimensions: int) -> np.ndarray:
+    """Hashed bag-of-words unit vector; accepts a string or a list of token ids."""
+    tokens = [str(token) for token in text] if isinstance(text, list) else _WORD_PATTERN.findall(text.casefold())
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token in tokens or [""]:
+        digest = _digest(token)
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        # Non-negative weights keep cosine similarity (and Chroma relevance scores) in [0, 1]
+        vector[index] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server with request counters; use as a context manager or call start()/stop()."""
+
+    def __init__(self, config: FakeServerConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeServerConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def simulate_latency(self) -> None:
+        with self._lock:
+            jitter = self._random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        time.sleep(max(0.0, self.config.latency_ms + jitter) / 1000)
+
+    def record(self, endpoint: str, prompt_tokens: int, completion_tokens: int = 0) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {}
+
+
+def _make_handler(server: FakeOpenAIServer):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                return
+            path = self.path.rstrip("/")
+            if path.endswith("/chat/completions"):
+                self._chat_completions(request)
+            elif path.endswith("/embeddings"):
+                self._embeddings(request)
+            else:
+                self._send_json(404, {"error": {"message": f"unknown endpoint {self.path}"}})
+
+        def _chat_completions(self, request: dict) -> None:
+            messages = request.get("messages", [])
+            model = request.get("model", "gpt-4o-mini")
+            prompt_tokens = sum(_count_tokens(m.get("content") or "") for m in messages)
+            reply = chat_reply(messages, server.config)
+            completion_tokens = _count_tokens(reply)
+            choices = max(1, int(request.get("n") or 1))
+            server.record("chat.completions", prompt_tokens, completion_tokens * choices)
+            server.simulate_latency()
+
+            created = int(time.time())
+            completion_id = "chatcmpl-" + hashlib.sha256(reply.encode("utf-8")).hexdigest()[:24]
+            if request.get("stream"):
+                usage = None
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    usage = {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    }
+                self._stream(completion_id, created, model, reply, usage)
+                return
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                    for i in range(choices)
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens * choices,
+                    "total_tokens": prompt_tokens + completion_tokens * choices,
+                },
+            })
+
+        def _stream(self, completion_id: str, created: int, model: str, reply: str, usage: dict = None) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send(delta, finish_reason=None):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            send({"role": "assistant", "content": ""})
+            words = reply.split(" ")
+            step = max(1, server.config.stream_chunk_words)
+            for start in range(0, len(words), step):
+                piece = " ".join(words[start:start + step])
+                send({"content": piece if start == 0 else " " + piece})
+                time.sleep(server.config.stream_chunk_delay_ms / 1000)
+            send({}, "stop")
+            if usage is not None:
+                # Final usage-only chunk, as sent for stream_options={"include_usage": true}
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [], "usage": usage,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _embeddings(self, request: dict) -> None:
+            inputs = request.get("input", [])
+            # A single string, a list of strings, or token id lists (one list per text)
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            dimensions = int(request.get("dimensions") or server.config.embedding_dimensions)
+            prompt_tokens = sum(len(text) if isinstance(text, list) else _count_tokens(text) for text in inputs)
+            server.record("embeddings", prompt_tokens)
+            server.simulate_latency()
+
+            data = []
+            for index, text in enumerate(inputs):
+                vector = embed_text(text, dimensions)
+                if request.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": index, "embedding": embedding})
+            self._send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "text-embedding-3-small"),
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+            })
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=FakeServerConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FakeServerConfig.jitter_ms)
+    parser.add_argument("--seed", type=int, default=FakeServerConfig.seed)
+    parser.add_argument("--reply-words", type=int, default=FakeServerConfig.reply_words)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed, reply_words=args.reply_words
+    )
+    server = FakeOpenAIServer(config, args.host, args.port)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Concurrent load test that replays historical threatData.csv queries and sample XML
+declarations as simulated sessions against the router and the fake OpenAI server.
+
+Run from src/chattingcustoms:
+    python -m benchmark.load_test --concurrency 1 2 4 8 16 --turns-per-session 5 --output load_test_results.json
+
+Each concurrency level runs that many sessions side by side. Sessions are either
+anonymous traders or logged-in officers. Every level reports p50/p99 latency,
+error rate and throughput. The first level where throughput stops growing, or
+p99 latency blows up, is reported as the saturation point.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import List
+
+from benchmark.fake_openai_server import FakeOpenAIServer, FakeServerConfig
+from benchmark import workloads
+from benchmark import run_benchmark
+
+THREAT_DATA_CSV_PATH = os.path.join(run_benchmark._root_directory, "datastore", "appData", "threatData.csv")
+
+# A level is saturated when doubling sessions adds less than this throughput gain...
+SATURATION_MIN_THROUGHPUT_GAIN = 0.10
+# ...or when p99 latency exceeds this multiple of the single-session p99
+SATURATION_P99_FACTOR = 3.0
+
+
+@dataclass
+class Workload:
+    trader_queries: List[str]
+    officer_queries: List[str]
+
+
+def load_workload(threat_data_path: str = THREAT_DATA_CSV_PATH) -> Workload:
+    """Historical threat queries plus the sample corpus; traders and officers get different mixes."""
+    historical = []
+    try:
+        with open(threat_data_path, newline="", encoding="utf-8") as file:
+            historical = [row["query"].strip() for row in csv.DictReader(file) if (row.get("query") or "").strip()]
+    except OSError as e:
+        print(f"❌ Could not read historical queries from {threat_data_path}: {e}")
+    return Workload(
+        trader_queries=historical + workloads.TRADER_QUERIES,
+        officer_queries=historical + workloads.OFFICER_QUERIES + workloads.SAMPLE_DECLARATIONS,
+    )
+
+
+def run_level(concurrency: int, turns_per_session: int, officer_ratio: float, workload: Workload,
+              route, server: FakeOpenAIServer, seed: int) -> dict:
+    """Runs `concurrency` sessions at once, each making `turns_per_session` sequential turns."""
+    server.reset_stats()
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency)
+
+    def session(session_id: int):
+        rng = random.Random(seed * 1000 + session_id)
+        is_officer = rng.random() < officer_ratio
+        queries = workload.officer_queries if is_officer else workload.trader_queries
+        start_barrier.wait()
+        for _ in range(turns_per_session):
+            query = rng.choice(queries)
+            started = time.perf_counter()
+            error = None
+            try:
+                run_benchmark.consume(route(query, stream=True, is_customs_officer=is_officer))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+
+    threads = [threading.Thread(target=session, args=(i,), name=f"session-{i}") for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    turns = len(latencies)
+    server_stats = server.get_stats()
+    result = {
+        "concurrency": concurrency,
+        "turns": turns,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / turns, 4) if turns else 0.0,
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_turns_per_second": round(turns / wall_seconds, 4) if wall_seconds else None,
+        "latency_seconds": {
+            "p50": round(run_benchmark.percentile(latencies, 50), 4),
+            "p99": round(run_benchmark.percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "openai_requests": {endpoint: stats["requests"] for endpoint, stats in server_stats.items()},
+    }
+    print(
+        f"  {concurrency:>4} sessions | {result['throughput_turns_per_second']:>8} turns/s | "
+        f"p50 {result['latency_seconds']['p50']}s | p99 {result['latency_seconds']['p99']}s | "
+        f"errors {result['error_rate']:.1%}"
+    )
+    return result
+
+
+def find_saturation(levels: List[dict]) -> dict:
+    """
+    Returns the first concurrency level where throughput gain fell below
+    SATURATION_MIN_THROUGHPUT_GAIN, p99 exceeded SATURATION_P99_FACTOR x the first
+    level's p99, or errors appeared. Returns None if no level saturated.
+    """
+    if not levels:
+        return None
+    baseline_p99 = levels[0]["latency_seconds"]["p99"] or 0.0
+    for previous, level in zip(levels, levels[1:]):
+        reasons = []
+        previous_throughput = previous["throughput_turns_per_second"] or 0.0
+        throughput = level["throughput_turns_per_second"] or 0.0
+        if previous_throughput and throughput < previous_throughput * (1 + SATURATION_MIN_THROUGHPUT_GAIN):
+            reasons.append(f"throughput gain below {SATURATION_MIN_THROUGHPUT_GAIN:.0%}")
+        if baseline_p99 and level["latency_seconds"]["p99"] > baseline_p99 * SATURATION_P99_FACTOR:
+            reasons.append(f"p99 above {SATURATION_P99_FACTOR}x single-session p99")
+        if level["errors"] and not previous["errors"]:
+            reasons.append("errors appeared")
+        if reasons:
+            return {"concurrency": level["concurrency"], "reasons": reasons}
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test against the fake OpenAI server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--turns-per-session", type=int, default=5)
+    parser.add_argument("--officer-ratio", type=float, default=0.3, help="Share of sessions that are logged-in officers")
+    parser.add_argument("--latency-ms", type=float, default=FakeServerConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FakeServerConfig.jitter_ms)
+    parser.add_argument("--seed", type=int, default=FakeServerConfig.seed)
+    parser.add_argument("--completion-cache", action="store_true", help="Keep the completion cache enabled")
+    parser.add_argument("--triage-mode", choices=["split", "combined"], default="split", help="Router triage mode")
+    parser.add_argument("--output", default="load_test_results.json", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    output_path = os.path.abspath(args.output)
+    config = FakeServerConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed)
+    sys.path.insert(0, os.path.abspath(os.path.join(run_benchmark._script_directory, "..")))
+    workload = load_workload()
+
+    with FakeOpenAIServer(config) as server, tempfile.TemporaryDirectory(prefix="chattingcustoms-load-") as work_directory:
+        run_benchmark.configure_environment(server.base_url, work_directory, args.completion_cache, args.triage_mode)
+        run_benchmark.redirect_persistent_files(work_directory)
+        run_benchmark.stub_network_lookups()
+        from helper import rag_util
+        from core import router
+        from helper import incident_util
+
+        started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        print(f"Loading RAG data from {run_benchmark.RAG_DATA_PATH}")
+        print(rag_util.load_rag(run_benchmark.RAG_DATA_PATH, "*.txt"))
+        print(
+            f"▶ {len(workload.trader_queries)} trader / {len(workload.officer_queries)} officer queries, "
+            f"{args.turns_per_session} turns per session"
+        )
+        levels = [
+            run_level(
+                concurrency, args.turns_per_session, args.officer_ratio, workload,
+                router.route_to_chatbot, server, args.seed
+            )
+            for concurrency in args.concurrency
+        ]
+        # Write queued threat incidents before the work directory is removed
+        incident_util.flush()
+        os.chdir(run_benchmark._root_directory)
+
+    saturation = find_saturation(levels)
+    if saturation:
+        print(f"⚠️ Saturation at {saturation['concurrency']} sessions: {', '.join(saturation['reasons'])}")
+    else:
+        print("✅ No saturation within the tested concurrency levels")
+
+    results = {
+        "schema_version": run_benchmark.RESULTS_SCHEMA_VERSION,
+        "started_at": started_at,
+        "git_commit": run_benchmark._git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "concurrency": args.concurrency,
+            "turns_per_session": args.turns_per_session,
+            "officer_ratio": args.officer_ratio,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "seed": args.seed,
+            "completion_cache": args.completion_cache,
+            "triage_mode": args.triage_mode,
+            "workload": {
+                "trader_queries": len(workload.trader_queries),
+                "officer_queries": len(workload.officer_queries),
+            },
+        },
+        "levels": levels,
+        "saturation": saturation,
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"✅ Load test results written to {output_path}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
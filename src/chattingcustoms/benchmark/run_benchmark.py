@@ -0,0 +1,247 @@
+"""
+Offline benchmark of the router, TNO chatbot and RAG pipeline against the fake OpenAI server.
+
+Run from src/chattingcustoms:
+    python -m benchmark.run_benchmark --latency-ms 200 --iterations 3 --output benchmark_results.json
+
+Every persistent file (vector_db, completion/embedding caches, incident store) is
+redirected to a temporary work directory, so the run never touches real data.
+Public IP and GeoIP lookups are stubbed, so the run makes no outside network calls.
+Results are written as JSON so two versions can be diffed.
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+from typing import Callable, List
+
+from benchmark.fake_openai_server import FakeOpenAIServer, FakeServerConfig
+from benchmark import workloads
+
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.abspath(os.path.join(_script_directory, "..", "..", ".."))
+RAG_DATA_PATH = os.path.join(_root_directory, "datastore", "ragData")
+
+RESULTS_SCHEMA_VERSION = 1
+
+# Fixed answers for the incident enrichment lookups (documentation IP, Singapore)
+FAKE_PUBLIC_IP = "203.0.113.10"
+FAKE_LOCATION = (1.3521, 103.8198)
+
+
+def configure_environment(base_url: str, work_directory: str, completion_cache: bool, triage_mode: str = "split") -> None:
+    """Point the app at the fake server. Must run before any helper module is imported."""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["TRIAGE_MODE"] = triage_mode
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-fake-key")
+    # tiktoken downloads its encodings on first use - not available on an offline build box.
+    # rag_util then batches document embeddings through the shared client, so request counts match production
+    os.environ["EMBEDDING_CHECK_CTX_LENGTH"] = "false"
+    os.environ["COMPLETION_CACHE_ENABLED"] = "true" if completion_cache else "false"
+    os.chdir(work_directory)
+
+
+def redirect_persistent_files(work_directory: str) -> None:
+    """Keep caches and the incident store of the run inside the work directory."""
+    from helper import cache_util
+    from helper import embedding_cache_util
+    from helper import incident_store_util
+
+    cache_util.CACHE_DB_PATH = os.path.join(work_directory, "completionCache.sqlite3")
+    embedding_cache_util.EMBEDDING_CACHE_DB_PATH = os.path.join(work_directory, "embeddingCache.sqlite3")
+    incident_store_util.INCIDENT_DB_PATH = os.path.join(work_directory, "threatIncidents.sqlite3")
+
+
+def stub_network_lookups() -> None:
+    """Answer the public IP and GeoIP lookups locally, like the fake server answers OpenAI calls."""
+    from helper import network_util
+    from helper import geo_location_util
+
+    network_util.get_public_ip = lambda: FAKE_PUBLIC_IP
+    geo_location_util.get_location_from_ip_local = lambda ip_address: FAKE_LOCATION
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(percent / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def consume(response) -> str:
+    """Drain streamed answers so their full generation time is measured."""
+    if isinstance(response, (types.GeneratorType, list)):
+        return "".join(response)
+    return str(response)
+
+
+def run_scenario(name: str, server: FakeOpenAIServer, turn: Callable, inputs: list, iterations: int) -> dict:
+    """
+    Runs turn(input) for every input, iterations times, one after another.
+
+    Returns:
+        dict: turns, errors, wall time, throughput, latency percentiles and
+        OpenAI calls/tokens per turn as seen by the fake server.
+    """
+    print(f"▶ {name}: {len(inputs)} input(s) x {iterations}")
+    server.reset_stats()
+    durations, errors = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for item in inputs:
+            turn_started = time.perf_counter()
+            try:
+                consume(turn(item))
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            durations.append(time.perf_counter() - turn_started)
+    wall_seconds = time.perf_counter() - started
+
+    turns = len(durations)
+    server_stats = server.get_stats()
+    result = {
+        "turns": turns,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_turns_per_second": round(turns / wall_seconds, 4) if wall_seconds else None,
+        "latency_seconds": {
+            "mean": round(sum(durations) / turns, 4) if turns else 0.0,
+            "p50": round(percentile(durations, 50), 4),
+            "p95": round(percentile(durations, 95), 4),
+            "max": round(max(durations), 4) if durations else 0.0,
+        },
+        "calls_per_turn": {
+            endpoint: round(stats["requests"] / turns, 3) for endpoint, stats in server_stats.items()
+        } if turns else {},
+        "tokens_per_turn": {
+            endpoint: round((stats["prompt_tokens"] + stats["completion_tokens"]) / turns, 1)
+            for endpoint, stats in server_stats.items()
+        } if turns else {},
+    }
+    print(
+        f"  wall {result['wall_seconds']}s | p50 {result['latency_seconds']['p50']}s | "
+        f"p95 {result['latency_seconds']['p95']}s | calls/turn {result['calls_per_turn']} | errors {len(errors)}"
+    )
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=_script_directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(server: FakeOpenAIServer, iterations: int, scenarios: List[str]) -> dict:
+    """Import the app against the fake server and run the selected scenarios."""
+    from helper import rag_util
+    from core import router
+    from core import tno_chatbot
+
+    def trader_turn(query):
+        return router.route_to_chatbot(query, stream=True, is_customs_officer=False)
+
+    def officer_turn(query):
+        return router.route_to_chatbot(query, stream=True, is_customs_officer=True)
+
+    available = {
+        # Ingest is measured once from scratch and once with nothing changed
+        "load_rag_cold": lambda: run_scenario(
+            "load_rag_cold", server, lambda _: rag_util.load_rag(RAG_DATA_PATH, "*.txt", force_rebuild=True), [None], 1
+        ),
+        "load_rag_warm": lambda: run_scenario(
+            "load_rag_warm", server, lambda _: rag_util.load_rag(RAG_DATA_PATH, "*.txt"), [None], 1
+        ),
+        "rag_query": lambda: run_scenario(
+            "rag_query", server, rag_util.rag_query, workloads.RAG_QUESTIONS, iterations
+        ),
+        "rule_enquiry_xml": lambda: run_scenario(
+            "rule_enquiry_xml", server, tno_chatbot.rule_enquiry, workloads.SAMPLE_DECLARATIONS, iterations
+        ),
+        "rule_enquiry_text": lambda: run_scenario(
+            "rule_enquiry_text", server, tno_chatbot.rule_enquiry, workloads.OFFICER_QUERIES, iterations
+        ),
+        "route_trader": lambda: run_scenario(
+            "route_trader", server, trader_turn, workloads.TRADER_QUERIES, iterations
+        ),
+        "route_officer": lambda: run_scenario(
+            "route_officer", server, officer_turn, workloads.OFFICER_QUERIES + workloads.SAMPLE_DECLARATIONS, iterations
+        ),
+    }
+    return {name: available[name]() for name in scenarios}
+
+
+SCENARIOS = [
+    "load_rag_cold", "load_rag_warm", "rag_query",
+    "rule_enquiry_xml", "rule_enquiry_text", "route_trader", "route_officer",
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ChattingCustoms benchmark")
+    parser.add_argument("--latency-ms", type=float, default=FakeServerConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FakeServerConfig.jitter_ms)
+    parser.add_argument("--seed", type=int, default=FakeServerConfig.seed)
+    parser.add_argument("--reply-words", type=int, default=FakeServerConfig.reply_words)
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over each scenario's inputs")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--completion-cache", action="store_true", help="Keep the completion cache enabled")
+    parser.add_argument("--triage-mode", choices=["split", "combined"], default="split", help="Router triage mode")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    output_path = os.path.abspath(args.output)
+    config = FakeServerConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed, reply_words=args.reply_words
+    )
+    # The app imports helper/core as top-level packages from src/chattingcustoms
+    sys.path.insert(0, os.path.abspath(os.path.join(_script_directory, "..")))
+
+    with FakeOpenAIServer(config) as server, tempfile.TemporaryDirectory(prefix="chattingcustoms-bench-") as work_directory:
+        configure_environment(server.base_url, work_directory, args.completion_cache, args.triage_mode)
+        redirect_persistent_files(work_directory)
+        stub_network_lookups()
+        started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        scenario_results = run_benchmarks(server, args.iterations, args.scenarios)
+        # Write queued threat incidents before the work directory is removed
+        from helper import incident_util
+        incident_util.flush()
+        os.chdir(_root_directory)
+
+    results = {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "started_at": started_at,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "seed": args.seed,
+            "reply_words": args.reply_words,
+            "iterations": args.iterations,
+            "completion_cache": args.completion_cache,
+            "triage_mode": args.triage_mode,
+        },
+        "scenarios": scenario_results,
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"✅ Benchmark results written to {output_path}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Sample inputs shared by the benchmark and load-test runners"""
+
+TRADER_QUERIES = [
+    "How do I start importing electronics into Singapore?",
+    "What documents do I need for my first export?",
+    "What are the basic steps for customs clearance?",
+    "What are the specific HS code requirements for medical devices?",
+    "How do I handle temporary import procedures for exhibition goods?",
+    "What are the latest changes in FTA documentation requirements?",
+]
+
+OFFICER_QUERIES = [
+    "What happens when the place is A and the address is missing?",
+    "Which rule rejects a declaration with a wrong date format?",
+    "Is Buy033 a registered user and what is its mailbox?",
+    "What is the total value of purchase 001?",
+    "Explain the cart sequence number rule",
+]
+
+RAG_QUESTIONS = [
+    "What is the required date format for submissions?",
+    "When is a transaction rejected for a missing place address?",
+    "What does the purchase reference rule check?",
+    "What is item 003?",
+    "Which mailbox belongs to Buy023?",
+]
+
+SAMPLE_DECLARATIONS = [
+    # Valid declaration
+    """<submissiondate>2025-10-25</submissiondate><dateofdeparture>2025-10-20</dateofdeparture>
+<place>A</place><address>10 Changi Road</address><changeindicator>N</changeindicator>
+<userid>Buy033</userid><type>NEWPURCHASE</type><actioncode>A</actioncode><mailboxid>mailbox033</mailboxid>
+<carts><cartnumberinformation><sequencenumber>1</sequencenumber></cartnumberinformation>
+<cartnumberinformation><sequencenumber>2</sequencenumber></cartnumberinformation></carts>""",
+    # Place A without an address
+    """<submissiondate>2025-10-25</submissiondate><dateofdeparture>2025-10-20</dateofdeparture>
+<place>A</place><address></address><changeindicator>N</changeindicator>
+<userid>Buy023</userid><type>NEWPURCHASE</type><actioncode>A</actioncode><mailboxid>mailbox023</mailboxid>""",
+    # Wrong date format and unregistered user
+    """<submissiondate>20251025</submissiondate><dateofdeparture>20251020</dateofdeparture>
+<place>D</place><address>1 Jurong Street</address><changeindicator>N</changeindicator>
+<userid>Buy999</userid><type>RETUR</type><actioncode>A</actioncode><mailboxid>mailbox999</mailboxid>""",
+    # Cart sequence numbers out of order
+    """<submissiondate>2025-10-25</submissiondate><dateofdeparture>2025-10-20</dateofdeparture>
+<place>B</place><address>5 Tuas Avenue</address><changeindicator>N</changeindicator>
+<userid>Buy033</userid><type>NEWPURCHASE</type><actioncode>A</actioncode><mailboxid>mailbox033</mailboxid>
+<carts><cartnumberinformation><sequencenumber>2</sequencenumber></cartnumberinformation>
+<cartnumberinformation><sequencenumber>1</sequencenumber></cartnumberinformation></carts>""",
+]
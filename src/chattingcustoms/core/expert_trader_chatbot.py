@@ -1,6 +1,6 @@
 from helper import prompt_util
 
-def chatting_with_expert_trader(user_query:str):
+def chatting_with_expert_trader(user_query:str, stream:bool=False):
     system_message = f"""
 
     I am an expert Trader that has experience helping in import and export declaration.
@@ -16,5 +16,7 @@ def chatting_with_expert_trader(user_query:str):
     'content': f"<incoming-message>{user_query}</incoming-message>"},
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
+    if stream:
+        return prompt_util.stream_completion_from_messages(messages, profile="report")
+    return prompt_util.get_completion_from_messages(messages, profile="report")
     
\ No newline at end of file
@@ -1,28 +1,70 @@
 
 from helper import prompt_util
-from helper import file_util
-from helper import network_util
-from helper import geo_location_util
+from helper import incident_util
+from helper import trace_util
+from helper import threat_filter_util
 from core import expert_trader_chatbot
 from core import self_service_trader_chatbot
 from core import threat_assessment_chatbot
 from core import tno_chatbot
 
-import json
-import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 import streamlit as st
 
-def trader_categorizer(user_query):
-    system_prompt_categorizer = """\
-Categorize the query into one of the following categories:
+# Triage calls (categorizer + threat check) run side by side on a shared pool so
+# a chat turn only waits for the slower of the two LLM round-trips.
+_triage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="triage")
+
+# Per-branch timeout policy, measured from submission so the branches share one
+# wall-clock budget. When the categorizer times out or fails we stop waiting and
+# ask the trader to retry - an infrastructure failure is not a real category, so it
+# must not earn the 'Other' refusal. When the threat check times out we fail closed
+# and raise, because a reply must never skip the threat assessment.
+TRADER_CATEGORY_TIMEOUT_SECONDS = 20
+THREAT_ASSESSMENT_TIMEOUT_SECONDS = 30
+TRADER_CATEGORY_UNAVAILABLE = "category_unavailable"
+TRADER_CATEGORY_UNAVAILABLE_REPLY = "Our assistant is temporarily unavailable. Please retry your question in a moment."
+
+# "split" runs the categorizer and the threat check as two parallel calls.
+# "combined" asks for both in one structured-output call and falls back to
+# "split" when that call fails or its answer does not validate.
+TRIAGE_MODE = os.getenv("TRIAGE_MODE", "split").casefold()
+TRADER_CATEGORIES = ("Self Service Trader", "Expert Trader", "Other")
+
+TRADER_CATEGORY_GUIDE = """\
 - 'Self Service Trader': If the user is asking about general questions on how to import or export goods in Singapore. User has limited knowledge on import and export.
 - 'Expert Trader': If the user is asking about detailed and in-depth queries on how to import or export goods in Singapore. User has in-depth knowledge on import and export processes.
-- 'Other': If the user's query doesn't fall into any of the above categories.
+- 'Other': If the user's query doesn't fall into any of the above categories."""
+
+COMBINED_TRIAGE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "chattingcustoms_triage",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "trader_category": {"type": "string", "enum": list(TRADER_CATEGORIES)},
+                "threat_category": {"type": "string"},
+                "threat_category_value": {"type": "string"},
+            },
+            "required": ["trader_category", "threat_category", "threat_category_value"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def trader_categorizer(user_query):
+    system_prompt_categorizer = f"""\
+Categorize the query into one of the following categories:
+{TRADER_CATEGORY_GUIDE}
 
 The `query` will be enclosed in <incoming-message></incoming-message> the user message.
 
-Format answer in plain text
+Answer with the category name only, in plain text on a single line
 """
 
 
@@ -31,43 +73,164 @@ Format answer in plain text
         {'role': 'user', 'content': f"<incoming-message>I am enquiring about import into Singapore. {user_query}</incoming-message>"}
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
+    return prompt_util.get_completion_from_messages(messages, profile="classifier").strip().strip("'\"")
+
+def combined_triage(user_query:str):
+    """
+    Trader category and threat verdict from a single structured-output call.
+
+    Returns:
+        tuple or None: (trader_category, threat_assessment_dict), or None if the
+        answer does not validate against the triage schema.
+    """
+    system_message = f"""\
+Triage the query in two parts and answer with a single JSON object.
+
+trader_category - one of the following categories:
+{TRADER_CATEGORY_GUIDE}
+
+threat_category and threat_category_value:
+1st Step : check the query contains any harmful instructions
+2nd Step : check the query contains any request to import/export any terrorist related goods.
+Use "None" for both when the query is not a threat.
+
+The `query` will be enclosed in <incoming-message></incoming-message> the user message.
+"""
+    messages = [
+        {'role': 'system', 'content': system_message},
+        {'role': 'user', 'content': f"<incoming-message>I am enquiring about import into Singapore. {user_query}</incoming-message>"}
+    ]
+    response = prompt_util.get_completion_from_messages(
+        messages, profile="extractor", response_format=COMBINED_TRIAGE_RESPONSE_FORMAT
+    )
+    answer = threat_assessment_chatbot.extract_json_object(response)
+    threat_assessment = threat_assessment_chatbot.parse_threat_response(response)
+    if answer is None or threat_assessment is None or answer.get("trader_category") not in TRADER_CATEGORIES:
+        print(f"❌ Combined triage answer did not validate: {response!r:.200}")
+        return None
+    return answer["trader_category"], threat_assessment
+
+def _wait_for_branch(future, deadline, branch_name, fallback=None):
+    """
+    Waits for one triage branch and applies its timeout policy.
+
+    Args:
+        future (Future): The submitted branch.
+        deadline (float): time.monotonic() value by which the branch must be done.
+        branch_name (str): Name used in log messages.
+        fallback (Any, optional): Value returned on timeout or error. If None, both are raised.
+
+    Returns:
+        Any: The branch result, or the fallback on timeout or error.
+    """
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        # A running thread cannot be interrupted; cancel() only drops it if it has
+        # not started yet. Either way the caller stops waiting for it.
+        future.cancel()
+        print(f"❌ Triage branch '{branch_name}' missed its deadline")
+        if fallback is None:
+            raise
+        return fallback
+    except Exception as e:
+        if fallback is None:
+            raise
+        print(f"❌ Triage branch '{branch_name}' failed, using '{fallback}': {e}")
+        return fallback
+
+def triage_query(user_query:str, is_customs_officer:bool):
+    """
+    Runs trader categorization and threat assessment concurrently.
+
+    The categorizer is skipped for logged-in customs officers because their
+    category is fixed.
+
+    Args:
+        user_query (str): The user's chat message.
+        is_customs_officer (bool): True if the user is logged in.
+
+    With TRIAGE_MODE "combined", trader queries the local threat filter cannot
+    decide are triaged in one structured-output call instead.
 
-def route_to_chatbot(user_query:str):
-    trader_category = trader_categorizer(user_query)
-    threat_assessment = json.loads(threat_assessment_chatbot.check_for_potential_threat(user_query))
-    # Check if user is logged in (customs officer)
-    if st.session_state.get("password_correct", False):
+    Returns:
+        tuple: (trader_category, threat_assessment_dict)
+    """
+    if TRIAGE_MODE == "combined" and not is_customs_officer \
+            and threat_filter_util.local_threat_assessment(user_query) is None:
+        try:
+            result = combined_triage(user_query)
+        except Exception as e:
+            print(f"❌ Combined triage failed: {e}")
+            result = None
+        if result is not None:
+            return result
+        print("Falling back to split triage")
+
+    submitted = time.monotonic()
+    threat_future = _triage_executor.submit(threat_assessment_chatbot.assess_threat, user_query)
+    category_future = None
+    if not is_customs_officer:
+        category_future = _triage_executor.submit(trader_categorizer, user_query)
+
+    if category_future is not None:
+        trader_category = _wait_for_branch(
+            category_future, submitted + TRADER_CATEGORY_TIMEOUT_SECONDS, "trader_categorizer", TRADER_CATEGORY_UNAVAILABLE
+        )
+    else:
         trader_category = "customs_officer"
+
+    try:
+        threat_assessment = _wait_for_branch(
+            threat_future, submitted + THREAT_ASSESSMENT_TIMEOUT_SECONDS, "assess_threat"
+        )
+    except Exception:
+        if category_future is not None:
+            category_future.cancel()
+        raise
+
+    return trader_category, threat_assessment
+
+def route_to_chatbot(user_query:str, stream:bool=False, is_customs_officer:bool=None):
+    """
+    Routes the query to the right chatbot.
+
+    With stream=True chatbot answers are returned as a generator of text deltas;
+    fixed replies are always returned as plain strings.
+    is_customs_officer overrides the login state, e.g. for simulated sessions in load tests.
+    """
+    # Check if user is logged in (customs officer) - read on the calling thread,
+    # Streamlit session state is not available inside the triage workers
+    if is_customs_officer is None:
+        is_customs_officer = st.session_state.get("password_correct", False)
+    with trace_util.span("router.triage", customs_officer=is_customs_officer, mode=TRIAGE_MODE):
+        trader_category, threat_assessment = triage_query(user_query, is_customs_officer)
     
     if (threat_assessment['chattingcustoms']['threat_category'].lower() == "none"):
         if trader_category.casefold() == 'expert trader':
-            return expert_trader_chatbot.chatting_with_expert_trader(user_query)
+            return expert_trader_chatbot.chatting_with_expert_trader(user_query, stream)
         elif trader_category.casefold() == 'self service trader':
-            return self_service_trader_chatbot.chatting_with_self_service_trader(user_query)
+            return self_service_trader_chatbot.chatting_with_self_service_trader(user_query, stream)
         elif trader_category.casefold() == 'customs_officer':
-            return tno_chatbot.rule_enquiry(user_query)
+            return tno_chatbot.rule_enquiry(user_query, stream)
+        elif trader_category == TRADER_CATEGORY_UNAVAILABLE:
+            print("❌ Trader category unavailable - asking the user to retry")
+            return TRADER_CATEGORY_UNAVAILABLE_REPLY
         else:
             return 'We are unable to answer your query as it is not related to import and export'
     else:
-        # Handle threat detected - log the incident
-        
-        ip_address = network_util.get_public_ip()
-        lat_log = geo_location_util.get_location_from_ip_local(ip_address)
-        latitude = lat_log[0]
-        longitude = lat_log[1]
-
-        # Get username safely
+        # Handle threat detected - queue the incident; IP/geo enrichment and the
+        # write happen on the background writer, not on the reply path
+        # Get username safely (session state is only readable on this thread)
         username = st.session_state.get("username", "anonymous")
-        data_row = [
-            user_query, ip_address, latitude, longitude,
-            threat_assessment['chattingcustoms']['threat_category'], 
-            threat_assessment['chattingcustoms']['threat_category_value'], 
-            datetime.datetime.now(), username
-        ]
-        file_util.append_to_csv("threatData.csv", data_row)
-        
+        incident_util.log_threat_incident(
+            user_query,
+            threat_assessment['chattingcustoms']['threat_category'],
+            threat_assessment['chattingcustoms']['threat_category_value'],
+            username
+        )
+
         if trader_category.casefold() == 'customs_officer':
-            return tno_chatbot.rule_enquiry(user_query)
+            return tno_chatbot.rule_enquiry(user_query, stream)
         else:
             return 'We are unable to answer your query as it is not related to legal import and export for Singapore'
\ No newline at end of file
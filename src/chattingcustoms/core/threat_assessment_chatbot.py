@@ -1,7 +1,66 @@
 from helper import prompt_util
-import os
+from helper import threat_filter_util
+import json
+import re
 
-def check_for_potential_threat(user_query:str):
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+
+def extract_json_object(text:str):
+    """
+    Parses the first JSON object in an LLM answer, tolerating markdown code
+    fences and prose around it.
+
+    Returns:
+        dict or None: The parsed object, or None if no valid JSON object was found.
+    """
+    if not text:
+        return None
+    text = _CODE_FENCE.sub("", text.strip())
+    try:
+        parsed = json.loads(text)
+        return parsed if isinstance(parsed, dict) else None
+    except ValueError:
+        pass
+    # Prose around the object - decode from each '{' until one parses
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            parsed, _ = decoder.raw_decode(text, start)
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+def parse_threat_response(text:str):
+    """
+    Parses a threat assessment answer into {'chattingcustoms': {'threat_category', 'threat_category_value'}}.
+    A flat {'threat_category': ...} object is accepted too.
+
+    Returns:
+        dict or None: The normalised assessment, or None if the answer is unusable.
+    """
+    parsed = extract_json_object(text)
+    if parsed is None:
+        return None
+    assessment = parsed.get("chattingcustoms", parsed)
+    if not isinstance(assessment, dict) or not isinstance(assessment.get("threat_category"), str):
+        return None
+    return {
+        "chattingcustoms": {
+            "threat_category": assessment["threat_category"].strip() or "None",
+            "threat_category_value": str(assessment.get("threat_category_value") or "None"),
+        }
+    }
+
+def check_for_potential_threat(user_query:str, refresh_cache:bool=False):
+    # Strong hits (and clear non-hits, if THREAT_FILTER_LOCAL_NON_HIT is on) are decided
+    # locally - everything else reaches the LLM
+    local_assessment = threat_filter_util.local_threat_assessment(user_query)
+    if local_assessment is not None:
+        return json.dumps(local_assessment)
 
     system_message = f"""
     1st Step : check the query contains any harmful instructions
@@ -19,5 +78,25 @@ def check_for_potential_threat(user_query:str):
     'content': f"<incoming-message>{user_query}</incoming-message>"},
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
-    
\ No newline at end of file
+    return prompt_util.get_completion_from_messages(messages, profile="extractor", refresh_cache=refresh_cache)
+
+def assess_threat(user_query:str):
+    """
+    Runs the threat check and parses its answer. A malformed answer is retried
+    once, and the retried answer replaces the malformed one in the completion
+    cache; if it is still unusable the check fails closed with a ValueError,
+    so no reply is produced without an assessment.
+
+    Returns:
+        dict: {'chattingcustoms': {'threat_category', 'threat_category_value'}}
+    """
+    response = check_for_potential_threat(user_query)
+    assessment = parse_threat_response(response)
+    if assessment is None:
+        print(f"❌ Malformed threat assessment, retrying: {response!r:.200}")
+        response = check_for_potential_threat(user_query, refresh_cache=True)
+        assessment = parse_threat_response(response)
+    if assessment is None:
+        raise ValueError("Threat assessment returned no valid JSON verdict")
+    return assessment
+
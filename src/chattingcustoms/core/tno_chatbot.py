@@ -1,5 +1,9 @@
 from helper import prompt_util
 from helper import rag_util
+from helper import xml_util
+from helper import rule_util
+from helper import reference_table_util
+from helper import trace_util
 
 extraction_list = """
 XML Tag Mapping for Trade Declaration Fields:
@@ -25,7 +29,7 @@ def declaration_xml_enquiry(user_query:str):
     'content': f"<incoming-message>{user_query}</incoming-message>"},
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
+    return prompt_util.get_completion_from_messages(messages, profile="extractor")
 def is_user_query_xml(user_query:str):
     system_message = f"""
 Determine if the user query contains XML-like tags for trade declaration data.
@@ -53,7 +57,7 @@ The user query will be enclosed in <incoming-message></incoming-message> tags.
         {'role': 'user', 'content': f"<incoming-message>{user_query}</incoming-message>"}
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
+    return prompt_util.get_completion_from_messages(messages, profile="classifier")
 def extract_user_query_xml(user_query:str):
     system_message = f"""
 Extract XML fields from the user query and return them as a readable summary.
@@ -77,22 +81,117 @@ The user query will be enclosed in <incoming-message></incoming-message> tags.
         {'role': 'user', 'content': f"<incoming-message>{user_query}</incoming-message>"}
     ]
 
-    return prompt_util.get_completion_from_messages(messages)
-def rule_enquiry(user_query:str):
+    return prompt_util.get_completion_from_messages(messages, profile="extractor")
+def detect_and_extract_xml(user_query:str):
+    """
+    Detects and extracts declaration fields with the local parser.
+    The LLM is only consulted when the query has markup the parser cannot read.
+
+    Returns:
+        tuple: (is_query_xml, xmlFieldsValue, declaration) - declaration is None when the LLM was used
+    """
+    declaration = xml_util.parse_declaration(user_query)
+    if declaration is not None:
+        return "true", xml_util.format_declaration_summary(declaration), declaration
+
+    if not xml_util.contains_xml_tags(user_query):
+        return "false", "", None
+
+    # Markup present but not recognised - fall back to the LLM detection and extraction
     is_query_xml = is_user_query_xml(user_query)
+    if is_query_xml.strip().casefold() == "true":
+        return "true", extract_user_query_xml(user_query.upper()), None
+    return "false", "", None
+
+def explain_rule_validation(user_query:str, declaration, xmlFieldsValue:str, stream:bool=False):
+    """
+    Validates a parsed declaration with the compiled rule engine.
+    The outcome is decided locally; the LLM only phrases the explanation.
+    """
+    with trace_util.span("rule_engine.validate"):
+        report = rule_util.validate_declaration(declaration)
+    trace_log = rule_util.format_trace_log(report)
+    print("rule engine trace log:\n" + trace_log)
+    missing_fields = ", ".join(declaration.missing_fields) if declaration.missing_fields else "none"
+
+    system_message = f"""
+You are a Singapore Customs officer with expertise in trade regulations and technical jargon.
+
+**Your Task:**
+Explain the validation result below to the officer. The rule engine has already
+applied the shopping rules and its outcome is FINAL - do not add, remove or change
+any PASS/REJECT result and do not change the Final Outcome.
+
+**Extracted Data:**
+{xmlFieldsValue}
+
+**Missing Fields:** {missing_fields}
+
+**Rule Engine Trace Log:**
+{trace_log}
+
+**Instructions:**
+- Keep every ✅ / ❌ / ➖ marker exactly as given in the trace log
+- Explain in one or two sentences why each ❌ rule was rejected
+- Rules marked ➖ were not evaluated because the declaration does not carry their fields - say so briefly
+- Structure your response with clear headings and bullet points
+
+**Response Format:**
+```markdown
+# Trade Declaration Validation Report
+
+## 📋 Extracted Data
+[List all extracted XML fields and their values]
+
+## 🔍 Rule Validation Steps
+[The trace log with a short explanation for each rejected rule]
+
+## 📊 Final Outcome
+**Status:** [as given by the rule engine]
+**Reason:** [as given by the rule engine]
+```
+
+The user query will be enclosed in <incoming-message></incoming-message> tags.
+"""
+    messages = [
+        {'role': 'system', 'content': system_message},
+        {'role': 'user', 'content': f"<incoming-message>{user_query.upper()}</incoming-message>"}
+    ]
+
+    if stream:
+        return prompt_util.stream_completion_from_messages(messages, profile="report")
+    return prompt_util.get_completion_from_messages(messages, profile="report")
+
+def format_reference_records(records):
+    """Render exact reference-table matches as markdown context."""
+    lines = ["**Reference Table Records (exact lookup):**"]
+    for record in records:
+        fields = ", ".join(f"{name}: {value}" for name, value in record._asdict().items())
+        lines.append(f"- {type(record).__name__}: {fields}")
+    return "\n".join(lines)
+
+def rule_enquiry(user_query:str, stream:bool=False):
+    is_query_xml, xmlFieldsValue, declaration = detect_and_extract_xml(user_query)
     print("user query " + user_query.upper())
     
-    # Initialize variables
-    xmlFieldsValue = ""
-    
+    # Locally parsed declarations go straight to the rule engine - no RAG lookup needed
+    if declaration is not None:
+        print ("xmlFieldsValue: " + xmlFieldsValue)
+        return explain_rule_validation(user_query, declaration, xmlFieldsValue, stream)
+
+    # Exact table records for any user id, item number or purchase id named in the query
+    reference_records = [] if is_query_xml.casefold() == "true" else reference_table_util.find_records_in_text(user_query)
+
     if (is_query_xml.casefold() == "true"):
-        xmlFieldsValue = extract_user_query_xml(user_query.upper())
         print ("xmlFieldsValue: " + xmlFieldsValue)
         rag_query_text = "Retrieve the rules related to " + xmlFieldsValue
     else:
         rag_query_text = "Retrieve the general trading rules for " + user_query
     
     rag_response = rag_util.rag_query(rag_query_text)
+    # Exact records supplement the retrieved rules, they never replace them
+    if reference_records:
+        rag_response = rag_response + "\n\n" + format_reference_records(reference_records)
     print(rag_response)
     
     if (is_query_xml.casefold() == "true"):
@@ -172,4 +271,6 @@ The user query will be enclosed in <incoming-message></incoming-message> tags.
         {'role': 'user', 'content': f"<incoming-message>{user_query.upper()}</incoming-message>"}
     ]
     
-    return prompt_util.get_completion_from_messages(messages)
\ No newline at end of file
+    if stream:
+        return prompt_util.stream_completion_from_messages(messages, profile="rag_answer")
+    return prompt_util.get_completion_from_messages(messages, profile="rag_answer")
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""BM25 inverted index over the RAG chunks, persisted next to the vector database"""
+
+import os
+import re
+import json
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+_lock = threading.Lock()
+_index = {
+    "path": None,
+    "documents": {},   # chunk_id -> {"text", "metadata", "length"}
+    "postings": {},    # term -> {chunk_id: term frequency}
+    "total_length": 0,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens; ids such as buy033 or 003 stay whole."""
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+def load_index(path: str) -> None:
+    """Load the persisted index from path (no-op if it is already loaded)."""
+    with _lock:
+        if _index["path"] == path:
+            return
+        _index["path"] = path
+        _index["documents"] = {}
+        _index["postings"] = {}
+        _index["total_length"] = 0
+        try:
+            with open(path, encoding="utf-8") as file:
+                stored = json.load(file)
+            _index["documents"] = stored["documents"]
+            _index["postings"] = stored["postings"]
+            _index["total_length"] = sum(document["length"] for document in stored["documents"].values())
+        except (OSError, ValueError, KeyError):
+            print(f"No BM25 index found at {path}, starting empty")
+
+
+def save_index() -> None:
+    """Write the index atomically to the path it was loaded from."""
+    with _lock:
+        path = _index["path"]
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"documents": _index["documents"], "postings": _index["postings"]}, file)
+        os.replace(temp_path, path)
+
+
+def clear(path: Optional[str] = None) -> None:
+    """
+    Drop every document - used when the vector collection is rebuilt from scratch.
+
+    Args:
+        path (str, optional): Index file to discard as well. It is recorded as the
+            loaded path, so a later load_index(path) cannot read stale chunks back in.
+    """
+    with _lock:
+        _index["documents"] = {}
+        _index["postings"] = {}
+        _index["total_length"] = 0
+        if path is not None:
+            _index["path"] = path
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def add_documents(chunk_ids: List[str], documents) -> None:
+    """
+    Index LangChain Documents under the same ids used in Chroma.
+
+    Args:
+        chunk_ids (List[str]): Ids of the chunks.
+        documents (List[Document]): The chunks themselves.
+    """
+    with _lock:
+        for chunk_id, document in zip(chunk_ids, documents):
+            tokens = tokenize(document.page_content)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                _index["postings"].setdefault(token, {})[chunk_id] = count
+            _index["documents"][chunk_id] = {
+                "text": document.page_content,
+                "metadata": dict(document.metadata),
+                "length": len(tokens),
+            }
+            _index["total_length"] += len(tokens)
+
+
+def remove_documents(chunk_ids: List[str]) -> None:
+    """Remove chunks from the index, e.g. when their source file changed or was deleted."""
+    with _lock:
+        for chunk_id in chunk_ids:
+            document = _index["documents"].pop(chunk_id, None)
+            if document is None:
+                continue
+            _index["total_length"] -= document["length"]
+            for token in set(tokenize(document["text"])):
+                postings = _index["postings"].get(token)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del _index["postings"][token]
+
+
+def search(query: str, k: int = 4) -> List[Tuple[str, float]]:
+    """
+    Ranks chunks for the query with BM25.
+
+    Returns:
+        List[Tuple[str, float]]: (chunk_id, score) pairs, best first.
+    """
+    with _lock:
+        document_count = len(_index["documents"])
+        if document_count == 0:
+            return []
+        average_length = _index["total_length"] / document_count
+        scores: Dict[str, float] = {}
+        for token in set(tokenize(query)):
+            postings = _index["postings"].get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, frequency in postings.items():
+                length = _index["documents"][chunk_id]["length"]
+                denominator = frequency + K1 * (1 - B + B * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (K1 + 1) / denominator
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def get_document(chunk_id: str) -> dict:
+    """Return the stored {"text", "metadata"} for a chunk id."""
+    with _lock:
+        return _index["documents"][chunk_id]
+
+
+def exact_id_tokens(query: str) -> List[str]:
+    """
+    Tokens that look like identifiers (mix letters and digits, e.g. user001 or buy033) and
+    occur in the index. Queries with such tokens are exact lookups the lexical index answers well.
+    Bare numbers such as 100 or 2024 are left out - they appear in ordinary questions.
+    """
+    with _lock:
+        return [
+            token for token in set(tokenize(query))
+            if any(char.isdigit() for char in token) and any(char.isalpha() for char in token)
+            and token in _index["postings"]
+        ]
@@ -0,0 +1,197 @@
+"""Content-addressed cache for deterministic LLM completions"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+CACHE_DB_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "appData", "completionCache.sqlite3"))
+
+# Cache sizing and expiry - tunable through environment variables
+MEMORY_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MEMORY_MAX_ENTRIES", "512"))
+DISK_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_DISK_MAX_ENTRIES", "20000"))
+TTL_SECONDS = int(os.getenv("COMPLETION_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "true").casefold() == "true"
+
+# Check disk size only every N writes to keep puts cheap
+_DISK_EVICTION_INTERVAL = 100
+
+_memory_cache = OrderedDict()
+_lock = threading.Lock()
+_connection = None
+_disk_available = True
+_writes_since_eviction = 0
+_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "writes": 0,
+    "memory_evictions": 0,
+    "disk_evictions": 0,
+}
+
+
+def make_key(**params: Any) -> str:
+    """
+    Builds a content-addressed cache key from the request parameters.
+
+    Args:
+        **params: Everything that influences the completion (model, messages, sampling params).
+
+    Returns:
+        str: SHA-256 hex digest of the canonical JSON encoding of the parameters.
+    """
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """Open the on-disk tier lazily. Returns None if SQLite is unavailable."""
+    global _connection, _disk_available
+    if _connection is None and _disk_available:
+        try:
+            os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+            _connection = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+            _connection.execute("PRAGMA journal_mode=WAL")
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS completion_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            _connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completion_cache_last_access ON completion_cache(last_access)"
+            )
+            _connection.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Completion cache disk tier disabled: {e}")
+            _connection = None
+            _disk_available = False
+    return _connection
+
+
+def _remember(key: str, value: str, created_at: float) -> None:
+    """Insert into the in-memory LRU tier, evicting the least recently used entry."""
+    _memory_cache[key] = (value, created_at)
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > MEMORY_MAX_ENTRIES:
+        _memory_cache.popitem(last=False)
+        _stats["memory_evictions"] += 1
+
+
+def get(key: str) -> Optional[str]:
+    """
+    Looks up a cached completion, memory tier first and then disk.
+
+    Args:
+        key (str): Key produced by make_key().
+
+    Returns:
+        Optional[str]: The cached completion, or None on a miss or expired entry.
+    """
+    now = time.time()
+    with _lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if now - created_at <= TTL_SECONDS:
+                _memory_cache.move_to_end(key)
+                _stats["memory_hits"] += 1
+                return value
+            del _memory_cache[key]
+
+        connection = _get_connection()
+        if connection is not None:
+            try:
+                row = connection.execute(
+                    "SELECT value, created_at FROM completion_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= TTL_SECONDS:
+                        connection.execute(
+                            "UPDATE completion_cache SET last_access = ? WHERE key = ?", (now, key)
+                        )
+                        connection.commit()
+                        _remember(key, value, created_at)
+                        _stats["disk_hits"] += 1
+                        return value
+                    connection.execute("DELETE FROM completion_cache WHERE key = ?", (key,))
+                    connection.commit()
+            except sqlite3.Error as e:
+                print(f"❌ Completion cache read failed: {e}")
+
+        _stats["misses"] += 1
+        return None
+
+
+def put(key: str, value: str) -> None:
+    """
+    Stores a completion in both tiers.
+
+    Args:
+        key (str): Key produced by make_key().
+        value (str): The completion text.
+    """
+    global _writes_since_eviction
+    now = time.time()
+    with _lock:
+        _remember(key, value, now)
+        _stats["writes"] += 1
+
+        connection = _get_connection()
+        if connection is None:
+            return
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            _writes_since_eviction += 1
+            if _writes_since_eviction >= _DISK_EVICTION_INTERVAL:
+                _writes_since_eviction = 0
+                _evict_disk(connection, now)
+            connection.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Completion cache write failed: {e}")
+
+
+def _evict_disk(connection, now: float) -> None:
+    """Drop expired rows, then the least recently used rows above DISK_MAX_ENTRIES."""
+    expired = connection.execute(
+        "DELETE FROM completion_cache WHERE created_at < ?", (now - TTL_SECONDS,)
+    ).rowcount
+    overflow = connection.execute(
+        "DELETE FROM completion_cache WHERE key IN ("
+        "SELECT key FROM completion_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+        (DISK_MAX_ENTRIES,)
+    ).rowcount
+    _stats["disk_evictions"] += max(expired, 0) + max(overflow, 0)
+
+
+def get_stats() -> dict:
+    """Return hit/miss/eviction counters plus the current tier sizes."""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory_cache)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def clear(include_disk: bool = True) -> None:
+    """Empty the memory tier and, optionally, the disk tier."""
+    with _lock:
+        _memory_cache.clear()
+        if include_disk:
+            connection = _get_connection()
+            if connection is not None:
+                connection.execute("DELETE FROM completion_cache")
+                connection.commit()
@@ -0,0 +1,169 @@
+"""Persistent embedding cache shared by the semantic chunker, Chroma ingest and query embeddings"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from helper import trace_util
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+# Kept outside vector_db/ so a vector database reset does not throw the cache away
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+EMBEDDING_CACHE_DB_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "appData", "embeddingCache.sqlite3"))
+
+MEMORY_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_MAX_ENTRIES", "4096"))
+
+_memory_cache = OrderedDict()
+_lock = threading.Lock()
+_connection = None
+_disk_available = True
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _get_connection():
+    """Open the on-disk tier lazily. Returns None if SQLite is unavailable."""
+    global _connection, _disk_available
+    if _connection is None and _disk_available:
+        try:
+            os.makedirs(os.path.dirname(EMBEDDING_CACHE_DB_PATH), exist_ok=True)
+            _connection = sqlite3.connect(EMBEDDING_CACHE_DB_PATH, check_same_thread=False)
+            _connection.execute("PRAGMA journal_mode=WAL")
+            # Vectors are stored as raw float32 bytes - 4 bytes per dimension
+            _connection.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, dimensions INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, PRIMARY KEY (model, text_hash))"
+            )
+            _connection.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Embedding cache disk tier disabled: {e}")
+            _connection = None
+            _disk_available = False
+    return _connection
+
+
+def _remember(key: tuple, vector: np.ndarray) -> None:
+    _memory_cache[key] = vector
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > MEMORY_MAX_ENTRIES:
+        _memory_cache.popitem(last=False)
+
+
+def get_or_embed(texts: List[str], model: str, embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+    """
+    Returns embeddings for texts, calling embed_fn only for texts not seen before.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        model (str): Embedding model name - part of the cache key.
+        embed_fn (Callable): Embeds a list of texts, e.g. OpenAIEmbeddings.embed_documents.
+
+    Returns:
+        List[List[float]]: One vector per input text, in input order.
+    """
+    keys = [(model, text_hash(text)) for text in texts]
+    vectors = [None] * len(texts)
+
+    with _lock:
+        missing_on_memory = []
+        for index, key in enumerate(keys):
+            vector = _memory_cache.get(key)
+            if vector is not None:
+                _memory_cache.move_to_end(key)
+                vectors[index] = vector
+                _stats["memory_hits"] += 1
+            else:
+                missing_on_memory.append(index)
+
+        connection = _get_connection()
+        if connection is not None and missing_on_memory:
+            hashes = list({keys[index][1] for index in missing_on_memory})
+            found = {}
+            # Stay under SQLite's bound-parameter limit
+            for offset in range(0, len(hashes), 500):
+                batch = hashes[offset:offset + 500]
+                placeholders = ",".join("?" * len(batch))
+                for row_hash, vector_bytes in connection.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ):
+                    found[row_hash] = np.frombuffer(vector_bytes, dtype=np.float32)
+            for index in missing_on_memory:
+                vector = found.get(keys[index][1])
+                if vector is not None:
+                    vectors[index] = vector
+                    _remember(keys[index], vector)
+                    _stats["disk_hits"] += 1
+
+    # Embed each distinct missing text once, outside the lock
+    pending = {}
+    for index, vector in enumerate(vectors):
+        if vector is None:
+            pending.setdefault(keys[index][1], []).append(index)
+    if pending:
+        pending_texts = [texts[indexes[0]] for indexes in pending.values()]
+        with trace_util.span("embedding", model=model, texts=len(pending_texts)):
+            new_vectors = [np.asarray(vector, dtype=np.float32) for vector in embed_fn(pending_texts)]
+        with _lock:
+            _stats["misses"] += len(pending_texts)
+            rows = []
+            for (hash_value, indexes), vector in zip(pending.items(), new_vectors):
+                _remember((model, hash_value), vector)
+                rows.append((model, hash_value, int(vector.shape[0]), vector.tobytes()))
+                for index in indexes:
+                    vectors[index] = vector
+            connection = _get_connection()
+            if connection is not None:
+                try:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO embedding_cache (model, text_hash, dimensions, vector) VALUES (?, ?, ?, ?)",
+                        rows
+                    )
+                    connection.commit()
+                except sqlite3.Error as e:
+                    print(f"❌ Embedding cache write failed: {e}")
+
+    return [vector.tolist() for vector in vectors]
+
+
+def get_stats() -> dict:
+    """Return hit/miss counters for the embedding cache."""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory_cache)
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that serves repeated texts from the embedding cache."""
+
+    def __init__(self, underlying: Embeddings, model: str,
+                 embed_documents_fn: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        """
+        Args:
+            underlying (Embeddings): Model used for cache misses.
+            model (str): Embedding model name - part of the cache key.
+            embed_documents_fn (Callable, optional): Batch embedder used for document misses
+                                                     instead of underlying.embed_documents.
+        """
+        self.underlying = underlying
+        self.model = model
+        self.embed_documents_fn = embed_documents_fn or underlying.embed_documents
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return get_or_embed(texts, self.model, self.embed_documents_fn)
+
+    def embed_query(self, text: str) -> List[float]:
+        return get_or_embed([text], self.model, lambda batch: [self.underlying.embed_query(batch[0])])[0]
@@ -1,5 +1,60 @@
 import os
+import atexit
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
 import geoip2.database
+import geoip2.errors
+
+from helper import trace_util
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+_root_dir = os.path.join(_script_dir, "..", "..", "..")
+GEOIP_DB_PATH = os.path.abspath(os.path.join(_root_dir, "datastore", "ragData", "GeoLite2-City.mmdb"))
+
+# Number of distinct IPs whose location is kept in memory
+LOOKUP_CACHE_SIZE = int(os.getenv("GEOIP_LOOKUP_CACHE_SIZE", "4096"))
+
+# Process-wide reader - opened once in mmap mode and shared by every lookup
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """
+    Returns the shared GeoLite2 reader, opening it on first use.
+
+    Raises:
+        FileNotFoundError: If GeoLite2-City.mmdb is missing.
+    """
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = geoip2.database.Reader(GEOIP_DB_PATH, mode=geoip2.database.MODE_MMAP)
+                atexit.register(close_reader)
+    return _reader
+
+
+def close_reader():
+    """Closes the shared reader and empties the lookup cache."""
+    global _reader
+    with _reader_lock:
+        if _reader is not None:
+            _reader.close()
+            _reader = None
+    _lookup_location.cache_clear()
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _lookup_location(ip_address):
+    """Cached lookup; raises on errors so failures are not cached."""
+    response = get_reader().city(ip_address)
+    return (response.location.latitude, response.location.longitude)
+
 
 def get_location_from_ip_local(ip_address):
     """
@@ -7,35 +62,40 @@ def get_location_from_ip_local(ip_address):
 
     Args:
         ip_address (str): The IP address to look up.
-        db_path (str): The path to the GeoLite2-City.mmdb file.
 
     Returns:
         tuple: (latitude, longitude) or None if location is not found.
     """
     try:
-        # Get the root directory path relative to this script location
-        # This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.join(script_dir, "..", "..", "..")
-        db_path = os.path.join(root_dir, "datastore", "ragData", "GeoLite2-City.mmdb")
-        # Create a reader object, specifying the path to your downloaded .mmdb file
-        with geoip2.database.Reader(db_path) as reader:
-            response = reader.city(ip_address)
-            
-            latitude = response.location.latitude
-            longitude = response.location.longitude
-            city = response.city.name
-            country = response.country.name
-            
-            print(f"IP: {ip_address}")
-            print(f"Location: {city}, {country}")
-            
-            return (latitude, longitude)
+        with trace_util.span("geoip.lookup"):
+            return _lookup_location(ip_address)
 
     except FileNotFoundError:
-        print(f"Error: MaxMind database file not found at '{db_path}'.")
+        print(f"Error: MaxMind database file not found at '{GEOIP_DB_PATH}'.")
         print("Please download GeoLite2-City.mmdb and ensure the path is correct.")
         return None
+    except geoip2.errors.AddressNotFoundError:
+        print(f"IP {ip_address} not found in the GeoLite2 database")
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
+
+
+def get_locations_from_ips_local(ip_addresses: Iterable[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+    """
+    Looks up many IP addresses at once, e.g. to re-geocode historical threatData.csv rows.
+    Each distinct IP is resolved once.
+
+    Args:
+        ip_addresses (Iterable[str]): IP addresses, duplicates allowed.
+
+    Returns:
+        Dict[str, Optional[Tuple[float, float]]]: IP -> (latitude, longitude) or None.
+    """
+    return {ip_address: get_location_from_ip_local(ip_address) for ip_address in set(ip_addresses) if ip_address}
+
+
+def get_cache_info():
+    """Return hit/miss statistics of the lookup cache."""
+    return _lookup_location.cache_info()
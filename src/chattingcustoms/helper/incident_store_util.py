@@ -0,0 +1,396 @@
+"""SQLite incident store for threat incidents, replacing the append-only threatData.csv"""
+
+import os
+import csv
+import sqlite3
+import datetime
+import threading
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from helper import trace_util
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+INCIDENT_DB_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "appData", "threatIncidents.sqlite3"))
+# Legacy CSV, imported once when the store is first created
+THREAT_DATA_CSV_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "appData", "threatData.csv"))
+
+# Seconds a writer waits for another session's transaction before giving up
+BUSY_TIMEOUT_SECONDS = float(os.getenv("INCIDENT_STORE_BUSY_TIMEOUT_SECONDS", "10"))
+
+COLUMNS = [
+    "query", "ip_address", "latitude", "longitude",
+    "threat_category", "threat_category_value", "date", "user",
+]
+# Columns the viewer may sort by; each leads an index, so ORDER BY ... LIMIT stays cheap
+SORT_COLUMNS = ["date", "threat_category", "ip_address"]
+# Low-cardinality text columns kept as pandas 'category' dtype in memory
+CATEGORY_COLUMNS = ["threat_category", "threat_category_value", "ip_address"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    ip_address TEXT,
+    latitude REAL,
+    longitude REAL,
+    threat_category TEXT NOT NULL,
+    threat_category_value TEXT,
+    date TEXT NOT NULL,
+    user TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_date ON incidents (date);
+CREATE INDEX IF NOT EXISTS idx_incidents_category_date ON incidents (threat_category, date);
+CREATE INDEX IF NOT EXISTS idx_incidents_ip_address ON incidents (ip_address);
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    threat_category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, threat_category)
+) WITHOUT ROWID;
+"""
+
+# Daily per-category rollup, kept in step with incidents inside the same transaction
+_ROLLUP_UPSERT = (
+    "INSERT INTO daily_counts (day, threat_category, count) VALUES (?, ?, ?) "
+    "ON CONFLICT (day, threat_category) DO UPDATE SET count = count + excluded.count"
+)
+_ROLLUP_REBUILD = [
+    ("DELETE FROM daily_counts", ()),
+    (
+        "INSERT INTO daily_counts (day, threat_category, count) "
+        "SELECT substr(date, 1, 10), threat_category, COUNT(*) FROM incidents GROUP BY 1, 2",
+        (),
+    ),
+    ("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('daily_counts_built', '1')", ()),
+]
+
+# One connection per thread - Streamlit sessions and the incident writer each get their own
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_path = None
+
+
+def _format_date(value) -> str:
+    """Store dates as sortable ISO text so range filters can use the date index."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time()).isoformat(sep=" ")
+    return pd.Timestamp(value).to_pydatetime().isoformat(sep=" ")
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _connect() -> sqlite3.Connection:
+    connection = getattr(_local, "connection", None)
+    if connection is None or getattr(_local, "path", None) != INCIDENT_DB_PATH:
+        os.makedirs(os.path.dirname(INCIDENT_DB_PATH), exist_ok=True)
+        # Autocommit mode - write transactions are opened explicitly in _insert_rows
+        connection = sqlite3.connect(INCIDENT_DB_PATH, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        _local.connection = connection
+        _local.path = INCIDENT_DB_PATH
+    return connection
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, creating the schema and importing the legacy CSV on first use."""
+    global _initialized_path
+    connection = _connect()
+    if _initialized_path != INCIDENT_DB_PATH:
+        with _init_lock:
+            if _initialized_path != INCIDENT_DB_PATH:
+                connection.executescript(_SCHEMA)
+                if connection.execute("SELECT 1 FROM store_meta WHERE key = 'daily_counts_built'").fetchone() is None:
+                    # Stores created before the rollup existed - build it once from the incidents
+                    _insert_rows(connection, [], _ROLLUP_REBUILD)
+                imported = connection.execute("SELECT value FROM store_meta WHERE key = 'csv_imported'").fetchone()
+                if imported is None:
+                    incidents = _read_csv(THREAT_DATA_CSV_PATH) if os.path.exists(THREAT_DATA_CSV_PATH) else []
+                    # Import and mark as imported in one transaction so a crash cannot import twice
+                    count = _insert_rows(connection, [_row_values(incident) for incident in incidents], [
+                        ("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('csv_imported', ?)", (str(len(incidents)),))
+                    ])
+                    print(f"✅ Imported {count} incidents from {THREAT_DATA_CSV_PATH}")
+                _initialized_path = INCIDENT_DB_PATH
+    return connection
+
+
+def _row_values(incident: dict) -> tuple:
+    return (
+        str(incident.get("query") or ""),
+        incident.get("ip_address") or None,
+        _to_float(incident.get("latitude")),
+        _to_float(incident.get("longitude")),
+        str(incident.get("threat_category") or ""),
+        incident.get("threat_category_value") or None,
+        _format_date(incident.get("date") or datetime.datetime.now()),
+        incident.get("user") or None,
+    )
+
+
+def insert_incidents(incidents: Iterable[dict]) -> int:
+    """
+    Inserts incidents in one transaction.
+
+    Args:
+        incidents (Iterable[dict]): Dicts keyed by COLUMNS; missing keys become NULL.
+
+    Returns:
+        int: Number of rows inserted.
+    """
+    rows = [_row_values(incident) for incident in incidents]
+    if not rows:
+        return 0
+    with trace_util.span("incident_store.insert", rows=len(rows)):
+        return _insert_rows(get_connection(), rows)
+
+
+def _insert_rows(connection: sqlite3.Connection, rows: List[tuple], extra_statements=()) -> int:
+    """Insert rows and their daily rollup counts, plus any (sql, params) statements, in a single write transaction."""
+    # Aggregate the batch first so each (day, category) is upserted once
+    rollup = {}
+    category_index, date_index = COLUMNS.index("threat_category"), COLUMNS.index("date")
+    for row in rows:
+        key = (row[date_index][:10], row[category_index])
+        rollup[key] = rollup.get(key, 0) + 1
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent sessions queue on
+    # busy_timeout instead of failing half-way through the batch
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(
+            f"INSERT INTO incidents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+        )
+        connection.executemany(_ROLLUP_UPSERT, [(day, category, count) for (day, category), count in rollup.items()])
+        for sql, params in extra_statements:
+            connection.execute(sql, params)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def _where(start_date=None, end_date=None, category: Optional[str] = None, ip_address: Optional[str] = None,
+           after_id: Optional[int] = None):
+    clauses, params = [], []
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(int(after_id))
+    if start_date is not None:
+        clauses.append("date >= ?")
+        params.append(_format_date(start_date))
+    if end_date is not None:
+        # end_date is inclusive of the whole day
+        clauses.append("date < ?")
+        params.append(_format_date(pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)))
+    if category is not None:
+        clauses.append("threat_category = ?")
+        params.append(category)
+    if ip_address is not None:
+        clauses.append("ip_address = ?")
+        params.append(ip_address)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """datetime64 dates and category dtype for repeated strings - vectorized filters, small frames."""
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], format="ISO8601")
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def query_incidents(start_date=None, end_date=None, category: Optional[str] = None,
+                    ip_address: Optional[str] = None, columns: Optional[List[str]] = None,
+                    after_id: Optional[int] = None, order_by: str = "date", descending: bool = False,
+                    limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+    """
+    Returns incidents matching the filters, oldest first. Every filter is served by an index.
+
+    Args:
+        start_date (date or datetime, optional): First day to include.
+        end_date (date or datetime, optional): Last day to include.
+        category (str, optional): Exact threat_category.
+        ip_address (str, optional): Exact ip_address.
+        columns (List[str], optional): Subset of "id" + COLUMNS to return; COLUMNS by default.
+        after_id (int, optional): Only incidents with a larger id, in id order - for tail loading.
+        order_by (str): One of SORT_COLUMNS; ties are broken by id so pages are stable.
+        descending (bool): Sort newest/largest first.
+        limit (int, optional): Page size; all rows by default.
+        offset (int): Rows to skip before the page.
+
+    Returns:
+        pd.DataFrame: The matching incidents, 'date' as datetime64 and CATEGORY_COLUMNS as category.
+    """
+    selected = [column for column in (columns or COLUMNS) if column == "id" or column in COLUMNS]
+    where, params = _where(start_date, end_date, category, ip_address, after_id)
+    direction = "DESC" if descending else "ASC"
+    if after_id is not None:
+        order = "id"
+    else:
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort incidents by {order_by!r}; expected one of {SORT_COLUMNS}")
+        order = f"{order_by} {direction}, id {direction}"
+    page = ""
+    if limit is not None:
+        page = " LIMIT ? OFFSET ?"
+        params = params + [int(limit), int(offset)]
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(selected)} FROM incidents{where} ORDER BY {order}{page}", get_connection(), params=params
+    )
+    return _compact_dtypes(df)
+
+
+def count_incidents(start_date=None, end_date=None, category: Optional[str] = None,
+                    ip_address: Optional[str] = None) -> int:
+    """Return the number of incidents matching the filters."""
+    where, params = _where(start_date, end_date, category, ip_address)
+    return get_connection().execute(f"SELECT COUNT(*) FROM incidents{where}", params).fetchone()[0]
+
+
+def get_categories() -> List[str]:
+    """Return the distinct threat categories, sorted."""
+    rows = get_connection().execute("SELECT DISTINCT threat_category FROM incidents ORDER BY threat_category")
+    return [row[0] for row in rows]
+
+
+def get_date_bounds():
+    """Return (first, last) incident date as datetime.date, or (None, None) when the store is empty."""
+    first, last = get_connection().execute("SELECT MIN(date), MAX(date) FROM incidents").fetchone()
+    if first is None:
+        return None, None
+    return pd.Timestamp(first).date(), pd.Timestamp(last).date()
+
+
+def get_daily_counts(days: int = 7, end_date=None) -> pd.DataFrame:
+    """
+    Returns incident counts per day and category from the rollup table.
+    Reads at most days x categories rows, however many incidents are stored.
+
+    Args:
+        days (int): Window length, counted back from end_date inclusive.
+        end_date (date, optional): Last day of the window; defaults to the last incident day.
+
+    Returns:
+        pd.DataFrame: Columns 'date' (datetime64), 'threat_category' (category) and 'count'.
+    """
+    connection = get_connection()
+    if end_date is None:
+        last_day = connection.execute("SELECT MAX(day) FROM daily_counts").fetchone()[0]
+        if last_day is None:
+            return _compact_dtypes(pd.DataFrame({"date": [], "threat_category": [], "count": []}))
+        end_date = pd.Timestamp(last_day)
+    end_day = pd.Timestamp(end_date).normalize()
+    start_day = end_day - pd.Timedelta(days=days - 1)
+    df = pd.read_sql_query(
+        "SELECT day AS date, threat_category, count FROM daily_counts WHERE day BETWEEN ? AND ? ORDER BY day",
+        connection, params=[start_day.strftime("%Y-%m-%d"), end_day.strftime("%Y-%m-%d")]
+    )
+    return _compact_dtypes(df)
+
+
+def get_data_version() -> tuple:
+    """Return (row count, last row id) - changes whenever incidents are added or removed."""
+    return tuple(get_connection().execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM incidents").fetchone())
+
+
+class IncidentFrame:
+    """
+    In-memory frame of incidents that is refreshed by reading only the rows
+    added since the last refresh (rows with id above the high-water mark).
+    """
+
+    def __init__(self, columns: Optional[List[str]] = None):
+        self.columns = [column for column in (columns or COLUMNS) if column in COLUMNS]
+        self.last_id = 0
+        self.frame = _compact_dtypes(pd.DataFrame({column: [] for column in self.columns}))
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Appends incidents written since the last refresh.
+
+        Returns:
+            int: Number of new incidents read.
+        """
+        with self._lock:
+            count, max_id = get_data_version()
+            if max_id < self.last_id or count < len(self.frame):
+                # Store was reset or rows were deleted - start over
+                self.last_id = 0
+                self.frame = self.frame.iloc[0:0]
+            if max_id == self.last_id:
+                return 0
+            new_rows = query_incidents(columns=["id"] + self.columns, after_id=self.last_id)
+            if new_rows.empty:
+                return 0
+            self.last_id = int(new_rows["id"].iloc[-1])
+            new_rows = new_rows.drop(columns="id")
+            if self.frame.empty:
+                self.frame = new_rows.reset_index(drop=True)
+            else:
+                # Merge category dictionaries so the appended frame stays categorical
+                for column in CATEGORY_COLUMNS:
+                    if column in self.columns:
+                        categories = self.frame[column].cat.categories.union(new_rows[column].cat.categories)
+                        self.frame[column] = self.frame[column].cat.set_categories(categories)
+                        new_rows[column] = new_rows[column].cat.set_categories(categories)
+                self.frame = pd.concat([self.frame, new_rows], ignore_index=True)
+            return len(new_rows)
+
+    def memory_usage_bytes(self) -> int:
+        """Deep memory usage of the in-memory frame."""
+        return int(self.frame.memory_usage(deep=True).sum())
+
+
+def import_csv(file_path: str) -> int:
+    """
+    Imports incidents from a threatData.csv-style file.
+
+    Rows without a 'user' value are kept with user NULL; multi-line quoted
+    queries are read as a single incident.
+
+    Returns:
+        int: Number of incidents imported.
+    """
+    return insert_incidents(_read_csv(file_path))
+
+
+def _read_csv(file_path: str) -> List[dict]:
+    with open(file_path, newline="", encoding="utf-8") as file:
+        return [
+            {column: (row.get(column) or "").strip() or None for column in COLUMNS}
+            for row in csv.DictReader(file)
+            if row.get("query") and row.get("date")
+        ]
+
+
+def export_csv(file_path, start_date=None, end_date=None, category: Optional[str] = None) -> int:
+    """
+    Exports incidents to a CSV file with the threatData.csv header.
+
+    Args:
+        file_path (str or file-like): Destination path or text buffer.
+        start_date, end_date, category: Same filters as query_incidents.
+
+    Returns:
+        int: Number of incidents exported.
+    """
+    df = query_incidents(start_date, end_date, category)
+    df.to_csv(file_path, index=False, columns=COLUMNS)
+    return len(df)
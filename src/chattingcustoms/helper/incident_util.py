@@ -0,0 +1,173 @@
+"""Background writer for threat incidents, so logging never delays the chat reply"""
+
+import os
+import queue
+import atexit
+import datetime
+import threading
+import time
+from typing import List
+
+from helper import incident_store_util
+from helper import network_util
+from helper import geo_location_util
+
+# Incidents waiting to be written; when full, new incidents are dropped and counted
+INCIDENT_QUEUE_SIZE = int(os.getenv("INCIDENT_QUEUE_SIZE", "1000"))
+# A batch is committed once it holds this many incidents or has waited this long
+INCIDENT_BATCH_SIZE = int(os.getenv("INCIDENT_BATCH_SIZE", "50"))
+INCIDENT_BATCH_SECONDS = float(os.getenv("INCIDENT_BATCH_SECONDS", "1.0"))
+# How long shutdown waits for queued incidents to be written
+INCIDENT_FLUSH_TIMEOUT_SECONDS = float(os.getenv("INCIDENT_FLUSH_TIMEOUT_SECONDS", "10"))
+
+_queue = queue.Queue(maxsize=INCIDENT_QUEUE_SIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
+_stop_event = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _start_writer() -> None:
+    """Start the writer thread on first use."""
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer_loop, name="incident-writer", daemon=True)
+                _writer_thread.start()
+                atexit.register(shutdown)
+
+
+def log_threat_incident(user_query: str, threat_category: str, threat_category_value: str, username: str) -> bool:
+    """
+    Queues a threat incident for the background writer. Never blocks.
+
+    Args:
+        user_query (str): The query that was flagged.
+        threat_category (str): Category from the threat assessment.
+        threat_category_value (str): Value from the threat assessment.
+        username (str): Logged-in user, read on the Streamlit thread.
+
+    Returns:
+        bool: True if queued, False if the queue was full and the incident was dropped.
+    """
+    _start_writer()
+    incident = {
+        "user_query": user_query,
+        "threat_category": threat_category,
+        "threat_category_value": threat_category_value,
+        "date": datetime.datetime.now(),
+        "username": username,
+    }
+    try:
+        _queue.put_nowait(incident)
+    except queue.Full:
+        _count("dropped")
+        print(f"❌ Incident queue full ({INCIDENT_QUEUE_SIZE}), dropped threat incident")
+        return False
+    _count("enqueued")
+    return True
+
+
+def _collect_batch() -> List[dict]:
+    """Wait for one incident, then gather more until the batch is full or its time is up."""
+    try:
+        batch = [_queue.get(timeout=INCIDENT_BATCH_SECONDS)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + INCIDENT_BATCH_SECONDS
+    while len(batch) < INCIDENT_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or _stop_event.is_set():
+            try:
+                batch.append(_queue.get_nowait())
+                continue
+            except queue.Empty:
+                break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _enrich(batch: List[dict]) -> List[dict]:
+    """Add IP address and location, resolving each once per batch, and build the store rows."""
+    # Every incident in this process is logged from the same host, so one lookup covers the batch
+    ip_address = network_util.get_public_ip()
+    location = geo_location_util.get_location_from_ip_local(ip_address) if ip_address else None
+    latitude, longitude = location if location else (None, None)
+    return [
+        {
+            "query": incident["user_query"], "ip_address": ip_address,
+            "latitude": latitude, "longitude": longitude,
+            "threat_category": incident["threat_category"],
+            "threat_category_value": incident["threat_category_value"],
+            "date": incident["date"], "user": incident["username"],
+        }
+        for incident in batch
+    ]
+
+
+def _write_batch(batch: List[dict]) -> None:
+    try:
+        # One transaction per batch - the group commit
+        incident_store_util.insert_incidents(_enrich(batch))
+        _count("written", len(batch))
+        _count("batches")
+    except Exception as e:
+        _count("failed", len(batch))
+        print(f"❌ Failed to write {len(batch)} threat incident(s): {e}")
+    finally:
+        for _ in batch:
+            _queue.task_done()
+
+
+def _writer_loop() -> None:
+    while not (_stop_event.is_set() and _queue.empty()):
+        batch = _collect_batch()
+        if batch:
+            _write_batch(batch)
+
+
+def flush(timeout: float = INCIDENT_FLUSH_TIMEOUT_SECONDS) -> bool:
+    """
+    Waits until every queued incident has been written.
+
+    Returns:
+        bool: True if the queue drained within the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() >= deadline or _writer_thread is None or not _writer_thread.is_alive():
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def shutdown(timeout: float = INCIDENT_FLUSH_TIMEOUT_SECONDS) -> None:
+    """Flush pending incidents and stop the writer; registered with atexit."""
+    global _writer_thread
+    if _writer_thread is None:
+        return
+    if not flush(timeout):
+        print(f"❌ {_queue.qsize()} threat incident(s) not written before shutdown")
+    _stop_event.set()
+    _writer_thread.join(timeout=INCIDENT_BATCH_SECONDS * 2)
+    with _writer_lock:
+        _writer_thread = None
+    _stop_event.clear()
+
+
+def get_stats() -> dict:
+    """Return enqueued/written/dropped/failed counters and the current queue depth."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["queue_depth"] = _queue.qsize()
+    return stats
@@ -9,16 +9,18 @@ def return_open_api_key():
     """Return OpenAI API Key from Streamlit secrets or fallback to .env"""
     try:
         return st.secrets["OPENAI_API_KEY"]
-    except KeyError:
+    except (KeyError, FileNotFoundError):
+        # FileNotFoundError: no secrets.toml at all, e.g. when run outside `streamlit run`
         st.warning("OPENAI_API_KEY not found in secrets.toml, trying .env files")
         load_dotenv()
         environment = os.getenv("environment")
         print(environment)
-        script_directory = os.path.dirname(os.path.abspath(__file__))
+        if environment:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
 
-        print(script_directory)
-        dotenv_path = file_util.find_file_in_parent_directories(environment + ".env", script_directory)
-        print(dotenv_path)
-        load_dotenv(dotenv_path)
+            print(script_directory)
+            dotenv_path = file_util.find_file_in_parent_directories(environment + ".env", script_directory)
+            print(dotenv_path)
+            load_dotenv(dotenv_path)
         return os.getenv("OPENAI_API_KEY")
     
\ No newline at end of file
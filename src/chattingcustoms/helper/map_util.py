@@ -0,0 +1,70 @@
+"""Server-side grid aggregation of incident locations for the threat map"""
+
+import numpy as np
+import pandas as pd
+
+# Zoom levels offered by the viewer; each level halves the grid cell size
+MIN_ZOOM = 1
+MAX_ZOOM = 12
+# Cells per 360 degrees of longitude at zoom 0
+BASE_CELLS = 4
+# Upper bound on markers sent to the browser; finer grids are coarsened until they fit
+MAX_CELLS = 5000
+# Marker radius in metres for the smallest and largest cell at a given zoom
+MIN_RADIUS_METERS = 20_000
+MAX_RADIUS_METERS = 400_000
+
+
+def cell_size_degrees(zoom: int) -> float:
+    """Grid cell edge in degrees for a map zoom level."""
+    return 360.0 / (BASE_CELLS * 2 ** zoom)
+
+
+def bin_locations(df: pd.DataFrame, zoom: int) -> pd.DataFrame:
+    """
+    Groups incidents into grid cells sized for the zoom level, one row per cell and category.
+
+    Args:
+        df (pd.DataFrame): Columns 'latitude', 'longitude' and 'threat_category'.
+        zoom (int): Map zoom level; higher means smaller cells. Lowered automatically
+            if the grid would produce more than MAX_CELLS rows.
+
+    Returns:
+        pd.DataFrame: Columns 'lat', 'lon' (mean position of the cell's incidents),
+        'threat_category', 'count' and 'size' (marker radius in metres).
+    """
+    located = df.dropna(subset=["latitude", "longitude", "threat_category"])
+    if located.empty:
+        return pd.DataFrame({"lat": [], "lon": [], "threat_category": [], "count": [], "size": []})
+
+    latitudes = located["latitude"].to_numpy(dtype=np.float64)
+    longitudes = located["longitude"].to_numpy(dtype=np.float64)
+    categories = located["threat_category"].astype("category")
+    category_codes = categories.cat.codes.to_numpy(dtype=np.int64)
+
+    cell = cell_size_degrees(zoom)
+    rows = np.floor((latitudes + 90.0) / cell).astype(np.int64)
+    columns = np.floor((longitudes + 180.0) / cell).astype(np.int64)
+    columns_per_row = int(np.ceil(360.0 / cell)) + 1
+    category_count = max(len(categories.cat.categories), 1)
+
+    # One integer key per (cell, category) so a single np.unique does the grouping
+    keys = (rows * columns_per_row + columns) * category_count + category_codes
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    if len(unique_keys) > MAX_CELLS and zoom > MIN_ZOOM:
+        return bin_locations(located, zoom - 1)
+    mean_latitudes = np.bincount(inverse, weights=latitudes) / counts
+    mean_longitudes = np.bincount(inverse, weights=longitudes) / counts
+
+    # Scale markers with the cell size so they stay readable at every zoom
+    scale = np.sqrt(counts / counts.max())
+    radius_cap = min(MAX_RADIUS_METERS, cell * 111_000 / 2)
+    sizes = np.maximum(MIN_RADIUS_METERS / 2 ** max(zoom - MIN_ZOOM, 0), scale * radius_cap)
+
+    return pd.DataFrame({
+        "lat": mean_latitudes,
+        "lon": mean_longitudes,
+        "threat_category": pd.Categorical.from_codes(unique_keys % category_count, categories.cat.categories),
+        "count": counts,
+        "size": sizes,
+    })
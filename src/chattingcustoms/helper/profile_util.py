@@ -0,0 +1,139 @@
+"""Named LLM call profiles - model, token budget, stop sequences and timeout per kind of call"""
+
+import os
+import json
+import threading
+from dataclasses import dataclass, replace, asdict
+from typing import Dict, List, Optional
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+# Optional JSON file with overrides, e.g. {"classifier": {"model": "gpt-4o-mini", "max_tokens": 8}}
+CALL_PROFILES_PATH = os.path.abspath(
+    os.getenv("CALL_PROFILES_PATH") or os.path.join(_root_directory, "datastore", "appData", "callProfiles.json")
+)
+
+DEFAULT_PROFILE = "default"
+
+
+@dataclass(frozen=True)
+class CallProfile:
+    model: str = "gpt-4o-mini"
+    max_tokens: int = 1024
+    stop: Optional[List[str]] = None
+    timeout_seconds: Optional[float] = None   # None keeps the client-wide REQUEST_TIMEOUT_SECONDS
+    temperature: float = 0
+
+
+# Built-in profiles. Classification answers are a few words on one line, so they
+# get a tiny token budget, stop at the first line break and time out quickly.
+_BUILTIN_PROFILES: Dict[str, CallProfile] = {
+    DEFAULT_PROFILE: CallProfile(),
+    # One-word/one-line labels: trader category, "true"/"false"
+    "classifier": CallProfile(max_tokens=8, stop=["\n"], timeout_seconds=10),
+    # Short structured output: threat verdict JSON, extracted fields, query variants
+    "extractor": CallProfile(max_tokens=512, timeout_seconds=20),
+    # Markdown guidance and validation reports shown to the user
+    "report": CallProfile(max_tokens=2048, timeout_seconds=60),
+    # Answers grounded on retrieved context
+    "rag_answer": CallProfile(max_tokens=1024, timeout_seconds=45),
+}
+
+_profiles: Optional[Dict[str, CallProfile]] = None
+_lock = threading.Lock()
+
+
+def _overrides_from_file(file_path: str) -> Dict[str, dict]:
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            overrides = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read call profiles from {file_path}: {e}")
+        return {}
+    if not isinstance(overrides, dict):
+        print(f"❌ Call profiles in {file_path} must be a JSON object of profile name -> settings")
+        return {}
+    return overrides
+
+
+def _overrides_from_env(names) -> Dict[str, dict]:
+    """CALL_PROFILE_<NAME>_<FIELD> variables, e.g. CALL_PROFILE_CLASSIFIER_MAX_TOKENS=4 or CALL_PROFILE_REPORT_MODEL=gpt-4o."""
+    overrides = {}
+    for name in names:
+        prefix = f"CALL_PROFILE_{name.upper()}_"
+        for field_name in CallProfile.__dataclass_fields__:
+            value = os.getenv(prefix + field_name.upper())
+            if value is None:
+                continue
+            overrides.setdefault(name, {})[field_name] = value
+    return overrides
+
+
+def _apply(profile: CallProfile, settings: dict, name: str) -> CallProfile:
+    changes = {}
+    for field_name, value in settings.items():
+        if field_name not in CallProfile.__dataclass_fields__:
+            print(f"❌ Ignoring unknown call profile setting '{name}.{field_name}'")
+            continue
+        if value is not None and field_name == "max_tokens":
+            value = int(value)
+        elif value is not None and field_name in ("timeout_seconds", "temperature"):
+            value = float(value)
+        elif isinstance(value, str) and field_name == "stop":
+            # A JSON list, or a single stop sequence
+            value = json.loads(value) if value.startswith("[") else [value]
+        changes[field_name] = value
+    return replace(profile, **changes)
+
+
+def load_profiles(file_path: str = None) -> Dict[str, CallProfile]:
+    """
+    Builds the profile registry: built-in defaults, then the JSON file, then environment variables.
+
+    Args:
+        file_path (str, optional): JSON override file. Defaults to CALL_PROFILES_PATH.
+
+    Returns:
+        Dict[str, CallProfile]: Profile name -> resolved profile.
+    """
+    profiles = dict(_BUILTIN_PROFILES)
+    file_overrides = _overrides_from_file(file_path or CALL_PROFILES_PATH)
+    env_overrides = _overrides_from_env(set(profiles) | set(file_overrides))
+    for overrides in (file_overrides, env_overrides):
+        for name, settings in overrides.items():
+            try:
+                profiles[name] = _apply(profiles.get(name, profiles[DEFAULT_PROFILE]), settings, name)
+            except (TypeError, ValueError) as e:
+                print(f"❌ Ignoring invalid call profile '{name}': {e}")
+    return profiles
+
+
+def get_profile(name: str = None) -> CallProfile:
+    """Return the named profile, falling back to the default profile for unknown names."""
+    global _profiles
+    if _profiles is None:
+        with _lock:
+            if _profiles is None:
+                _profiles = load_profiles()
+    name = name or DEFAULT_PROFILE
+    if name not in _profiles:
+        print(f"❌ Unknown call profile '{name}', using '{DEFAULT_PROFILE}'")
+        return _profiles[DEFAULT_PROFILE]
+    return _profiles[name]
+
+
+def reload() -> None:
+    """Drop the resolved registry so the next get_profile() re-reads file and environment."""
+    global _profiles
+    with _lock:
+        _profiles = None
+
+
+def describe() -> Dict[str, dict]:
+    """Resolved profiles as plain dicts, e.g. for logging or benchmark output."""
+    get_profile()
+    return {name: asdict(profile) for name, profile in _profiles.items()}
@@ -1,22 +1,206 @@
+import os
+import time
+import threading
 
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, NOT_GIVEN
 from helper import key_util
+from helper import cache_util
+from helper import trace_util
+from helper import profile_util
 
 # This is the "Updated" helper function for calling LLM
 ApiKey = key_util.return_open_api_key()
 
+# Connection pool settings shared by every OpenAI client in the process.
+# Tunable through environment variables without code changes.
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("OPENAI_REQUEST_TIMEOUT_SECONDS", "60"))
+# Alternative OpenAI-compatible endpoint, e.g. the local fake server used by the benchmarks.
+# None keeps the official API.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Process-wide client instances - created lazily, reused by every chatbot and rag_util
+_client = None
+_async_client = None
+_http_client = None
+_http_async_client = None
+_client_lock = threading.Lock()
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+    )
+
+def get_http_client():
+    """Return the shared pooled httpx.Client used by all synchronous OpenAI clients."""
+    global _http_client
+    if _http_client is None:
+        with _client_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(limits=_pool_limits(), timeout=REQUEST_TIMEOUT_SECONDS)
+    return _http_client
+
+def get_http_async_client():
+    """Return the shared pooled httpx.AsyncClient used by all asynchronous OpenAI clients."""
+    global _http_async_client
+    if _http_async_client is None:
+        with _client_lock:
+            if _http_async_client is None:
+                _http_async_client = httpx.AsyncClient(limits=_pool_limits(), timeout=REQUEST_TIMEOUT_SECONDS)
+    return _http_async_client
+
+def get_client():
+    """Return the process-wide OpenAI client, keeping HTTP keep-alive and TLS sessions between calls."""
+    global _client
+    if _client is None:
+        http_client = get_http_client()
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(api_key=ApiKey, base_url=OPENAI_BASE_URL, http_client=http_client)
+    return _client
+
+def get_async_client():
+    """Return the process-wide AsyncOpenAI client - async twin of get_client()."""
+    global _async_client
+    if _async_client is None:
+        http_async_client = get_http_async_client()
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(api_key=ApiKey, base_url=OPENAI_BASE_URL, http_client=http_async_client)
+    return _async_client
+
+def _resolve_call(profile, model, temperature, max_tokens):
+    """
+    Fills unset call parameters from the named profile (see profile_util).
+
+    Returns:
+        tuple: (model, temperature, max_tokens, stop, timeout) - timeout is None for the client default
+    """
+    call_profile = profile_util.get_profile(profile)
+    return (
+        model or call_profile.model,
+        call_profile.temperature if temperature is None else temperature,
+        max_tokens or call_profile.max_tokens,
+        call_profile.stop,
+        call_profile.timeout_seconds,
+    )
+
+def _completion_cache_key(messages, model, temperature, top_p, max_tokens, n, use_cache, stop=None, response_format=None):
+    """Return the cache key for a deterministic call, or None if the call must not be cached."""
+    # Only temperature-0 single-choice calls are deterministic enough to reuse
+    if not use_cache or not cache_util.CACHE_ENABLED or temperature != 0 or n != 1:
+        return None
+    return cache_util.make_key(
+        model=model, messages=messages, temperature=temperature,
+        top_p=top_p, max_tokens=max_tokens, n=n, stop=stop, response_format=response_format
+    )
+
 # This a "modified" helper function that we will discuss in this session
 # Note that this function directly take in "messages" as the parameter.
-def get_completion_from_messages( messages, model="gpt-4o-mini", temperature=0, top_p=1.0, max_tokens=1024, n=1):
-    client = OpenAI(api_key=ApiKey)
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens,
-        n=n
-    )
-    return response.choices[0].message.content
+# Set use_cache=False to bypass the completion cache for a single call, or
+# refresh_cache=True to skip the cached answer and overwrite it with a fresh one.
+# profile names a call profile (profile_util) supplying model, max_tokens, stop and
+# timeout; explicitly passed model/temperature/max_tokens take precedence.
+# response_format is passed through for JSON mode / structured outputs, e.g.
+# {"type": "json_schema", "json_schema": {...}}.
+def get_completion_from_messages( messages, model=None, temperature=None, top_p=1.0, max_tokens=None, n=1, use_cache=True, profile=None, response_format=None, refresh_cache=False):
+    model, temperature, max_tokens, stop, timeout = _resolve_call(profile, model, temperature, max_tokens)
+    cache_key = _completion_cache_key(messages, model, temperature, top_p, max_tokens, n, use_cache, stop, response_format)
+    if cache_key is not None and not refresh_cache:
+        cached = cache_util.get(cache_key)
+        if cached is not None:
+            return cached
+
+    client = get_client()
+    with trace_util.span("llm.completion", model=model, profile=profile or profile_util.DEFAULT_PROFILE) as span:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            n=n,
+            stop=stop or NOT_GIVEN,
+            response_format=response_format or NOT_GIVEN,
+            timeout=timeout if timeout is not None else NOT_GIVEN
+        )
+        trace_util.set_usage(span, response.usage)
+    content = response.choices[0].message.content
+    if cache_key is not None and content is not None:
+        cache_util.put(cache_key, content)
+    return content
+
+def stream_completion_from_messages( messages, model=None, temperature=None, top_p=1.0, max_tokens=None, use_cache=True, profile=None):
+    """
+    Streaming variant of get_completion_from_messages - a generator of text deltas.
+    A cached completion is yielded as a single delta; a fresh one is cached once fully received.
+    """
+    model, temperature, max_tokens, stop, timeout = _resolve_call(profile, model, temperature, max_tokens)
+    cache_key = _completion_cache_key(messages, model, temperature, top_p, max_tokens, 1, use_cache, stop)
+    if cache_key is not None:
+        cached = cache_util.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    client = get_client()
+    parts = []
+    stream_started = time.perf_counter()
+    # The span covers the whole stream; the final usage chunk carries the token counts
+    with trace_util.span("llm.stream", model=model, profile=profile or profile_util.DEFAULT_PROFILE) as span:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            stop=stop or NOT_GIVEN,
+            timeout=timeout if timeout is not None else NOT_GIVEN,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            trace_util.set_usage(span, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    span.attributes["first_token_seconds"] = round(time.perf_counter() - stream_started, 4)
+                parts.append(delta)
+                yield delta
+    if cache_key is not None and parts:
+        cache_util.put(cache_key, "".join(parts))
 
+async def get_completion_from_messages_async( messages, model=None, temperature=None, top_p=1.0, max_tokens=None, n=1, use_cache=True, profile=None, response_format=None):
+    """Async variant of get_completion_from_messages using the shared AsyncOpenAI client."""
+    model, temperature, max_tokens, stop, timeout = _resolve_call(profile, model, temperature, max_tokens)
+    cache_key = _completion_cache_key(messages, model, temperature, top_p, max_tokens, n, use_cache, stop, response_format)
+    if cache_key is not None:
+        cached = cache_util.get(cache_key)
+        if cached is not None:
+            return cached
 
+    client = get_async_client()
+    with trace_util.span("llm.completion", model=model, profile=profile or profile_util.DEFAULT_PROFILE) as span:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            n=n,
+            stop=stop or NOT_GIVEN,
+            response_format=response_format or NOT_GIVEN,
+            timeout=timeout if timeout is not None else NOT_GIVEN
+        )
+        trace_util.set_usage(span, response.usage)
+    content = response.choices[0].message.content
+    if cache_key is not None and content is not None:
+        cache_util.put(cache_key, content)
+    return content
@@ -1,21 +1,27 @@
 import glob
 import os
-from openai import OpenAI
-from helper import key_util
+from helper import prompt_util
+from helper import embedding_cache_util
+from helper import bm25_util
+from helper import trace_util
 from langchain_community.document_loaders import TextLoader
 from langchain_openai import OpenAIEmbeddings
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_chroma import Chroma
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.chains.retrieval_qa.base import RetrievalQA
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
+from langchain_core.documents import Document
 import logging
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import hashlib
+import json
+import datetime
 
 # Disable ChromaDB telemetry completely - follows project pattern for error prevention
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
-os.environ["CHROMA_DB_IMPL"] = "duckdb+parquet"
+# chromadb>=0.4 rejects the legacy CHROMA_DB_IMPL setting, so it is not set here
 import chromadb
 from chromadb.config import Settings
 
@@ -34,28 +40,65 @@ CHROMA_CONFIG = {
     "client_settings": chromadb_settings
 }
 
+# Per-file content hashes and chunk ids, used to re-ingest only what changed
+INGEST_MANIFEST_PATH = os.path.join(CHROMA_CONFIG["persist_directory"], "ingest_manifest.json")
+# Lexical (BM25) index over the same chunks, kept in step with the collection on every ingest
+BM25_INDEX_PATH = os.path.join(CHROMA_CONFIG["persist_directory"], "bm25_index.json")
+
 # Global client instance to prevent multiple Chroma instances - follows project's singleton pattern
 _chroma_client = None
 
+# Bumped whenever load_rag publishes a new index or the database is reset;
+# retrieval services built for an older generation are discarded
+_collection_generation = 0
+_generation_lock = threading.Lock()
+
 # Refer to LangChain documentation to find which loggers to set
 # Different LangChain Classes/Modules have different loggers to set
 logging.basicConfig()
 logging.getLogger("langchain.retrievers.multi_query").setLevel(logging.INFO)
 
-# This is the "Updated" helper function for calling LLM - follows project pattern
-ApiKey = key_util.return_open_api_key()
-client = OpenAI(api_key=ApiKey)
-# embedding model that we will use for the session
-embeddings_model = OpenAIEmbeddings(model='text-embedding-3-small')
-llm = ChatOpenAI(model='gpt-4o-mini', temperature=0)
+# LangChain models share prompt_util's pooled HTTP clients so RAG calls reuse the
+# same keep-alive connections as the chatbots
+# Wrapped in the persistent embedding cache so the chunker, Chroma ingest and
+# query embeddings never pay twice for the same text
+# Token-level length checks need tiktoken's encoding files, which are downloaded on
+# first use - set EMBEDDING_CHECK_CTX_LENGTH=false on offline machines (e.g. benchmarks)
+EMBEDDING_CHECK_CTX_LENGTH = os.getenv("EMBEDDING_CHECK_CTX_LENGTH", "true").casefold() == "true"
+# Texts per embeddings request, same as OpenAIEmbeddings' default chunk_size
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "1000"))
+
+def embed_texts(texts, model='text-embedding-3-small'):
+    """Embed texts through the shared OpenAI client, EMBEDDING_BATCH_SIZE texts per request."""
+    client = prompt_util.get_client()
+    embeddings = []
+    for offset in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = client.embeddings.create(
+            input=texts[offset:offset + EMBEDDING_BATCH_SIZE],
+            model=model
+        )
+        embeddings.extend(x.embedding for x in sorted(response.data, key=lambda x: x.index))
+    return embeddings
+
+embeddings_model = embedding_cache_util.CachedEmbeddings(
+    OpenAIEmbeddings(
+        model='text-embedding-3-small',
+        openai_api_key=prompt_util.ApiKey,
+        openai_api_base=prompt_util.OPENAI_BASE_URL,
+        check_embedding_ctx_length=EMBEDDING_CHECK_CTX_LENGTH,
+        http_client=prompt_util.get_http_client(),
+        http_async_client=prompt_util.get_http_async_client()
+    ),
+    model='text-embedding-3-small',
+    # Without the length check OpenAIEmbeddings sends one request per text, so
+    # documents go through the batched shared client instead
+    embed_documents_fn=None if EMBEDDING_CHECK_CTX_LENGTH else embed_texts
+)
 
 def get_embedding(input, model='text-embedding-3-small'):
-    """Get embeddings using OpenAI API - maintains existing interface"""
-    response = client.embeddings.create(
-        input=input,
-        model=model
-    )
-    return [x.embedding for x in response.data]
+    """Get embeddings using OpenAI API - maintains existing interface, served from the embedding cache"""
+    texts = [input] if isinstance(input, str) else list(input)
+    return embedding_cache_util.get_or_embed(texts, model, lambda batch: embed_texts(batch, model))
 
 def textloader_for_files_in_directory(directory_path, file_mask):
     """
@@ -107,6 +150,8 @@ def reset_vector_db(persist_directory):
     """
     global _chroma_client
     _chroma_client = None  # Reset global client instance
+    bm25_util.clear()
+    publish_collection_generation()
     
     if os.path.exists(persist_directory):
         print(f"Resetting vector database at {persist_directory}")
@@ -141,84 +186,176 @@ def get_chroma_client():
     
     return _chroma_client
 
-def load_rag(directory_path, file_mask):
+def compute_file_hash(file_path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_ingest_manifest():
+    """
+    Load the per-file ingest manifest kept next to the vector database.
+    Shape: {"files": {key: {"sha256", "chunk_ids", "ingested_at"}}, "tombstones": {key: {...}}}
+    Returns None if the manifest is missing or unreadable.
+    """
+    try:
+        with open(INGEST_MANIFEST_PATH, encoding="utf-8") as file:
+            manifest = json.load(file)
+        manifest.setdefault("files", {})
+        manifest.setdefault("tombstones", {})
+        return manifest
+    except (OSError, ValueError):
+        return None
+
+def save_ingest_manifest(manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file."""
+    os.makedirs(os.path.dirname(INGEST_MANIFEST_PATH), exist_ok=True)
+    temp_path = INGEST_MANIFEST_PATH + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, INGEST_MANIFEST_PATH)
+
+def _collection_exists(chroma_client):
+    try:
+        chroma_client.get_collection(name=CHROMA_CONFIG["collection_name"])
+        return True
+    except Exception:
+        return False
+
+def _open_vectorstore(chroma_client):
+    """Open the customs collection with IDENTICAL settings as rag_query."""
+    return Chroma(
+        collection_name=CHROMA_CONFIG["collection_name"],
+        persist_directory=CHROMA_CONFIG["persist_directory"],
+        embedding_function=embeddings_model,
+        client=chroma_client
+    )
+
+def _backfill_lexical_index(vectorstore, manifest):
+    """Rebuild the BM25 index from chunks already stored in Chroma - no embedding calls needed."""
+    chunk_ids = [chunk_id for entry in manifest["files"].values() for chunk_id in entry["chunk_ids"]]
+    if not chunk_ids:
+        return
+    stored = vectorstore.get(ids=chunk_ids)
+    documents = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(stored["documents"], stored["metadatas"])
+    ]
+    bm25_util.add_documents(stored["ids"], documents)
+    print(f"BM25 index backfilled with {len(documents)} chunks")
+
+def _ingest_changes(directory_path, file_mask, force_rebuild):
+    """
+    Re-chunk and re-embed only new or changed files; tombstone vectors of deleted files.
+
+    Returns:
+        dict: counts of changed, unchanged and removed files plus chunks added
+    """
+    files_on_disk = {
+        os.path.relpath(file_path, directory_path): file_path
+        for file_path in sorted(glob.glob(os.path.join(directory_path, file_mask)))
+    }
+    chroma_client = get_chroma_client()
+    manifest = load_ingest_manifest()
+
+    # A missing collection means the manifest no longer describes what is stored. A collection
+    # without a manifest was built by the old drop-and-rebuild load_rag under random ids that
+    # can't be matched to files, so it is rebuilt instead of duplicated.
+    if force_rebuild or manifest is None or not _collection_exists(chroma_client):
+        try:
+            chroma_client.delete_collection(name=CHROMA_CONFIG["collection_name"])
+            print("Existing collection deleted")
+        except Exception:
+            print("No existing collection found, proceeding with creation")
+        manifest = {"files": {}, "tombstones": {}}
+        bm25_util.clear(BM25_INDEX_PATH)
+
+    vectorstore = _open_vectorstore(chroma_client)
+    bm25_util.load_index(BM25_INDEX_PATH)
+    if not os.path.exists(BM25_INDEX_PATH) and manifest["files"]:
+        _backfill_lexical_index(vectorstore, manifest)
+    text_splitter = SemanticChunker(embeddings_model)
+    stats = {"changed": 0, "unchanged": 0, "removed": 0, "chunks_added": 0}
+    now = datetime.datetime.now().isoformat()
+
+    for key, file_path in files_on_disk.items():
+        file_hash = compute_file_hash(file_path)
+        entry = manifest["files"].get(key)
+        if entry is not None and entry["sha256"] == file_hash:
+            stats["unchanged"] += 1
+            continue
+
+        print(f"Processing file: {file_path}")
+        documents = TextLoader(file_path).load()
+        for document in documents:
+            document.metadata["source_key"] = key
+            document.metadata["sha256"] = file_hash
+        chunks = text_splitter.split_documents(documents)
+        chunk_ids = [f"{key}:{file_hash[:12]}:{index}" for index in range(len(chunks))]
+
+        if entry is not None and entry["chunk_ids"]:
+            vectorstore.delete(ids=entry["chunk_ids"])
+            bm25_util.remove_documents(entry["chunk_ids"])
+        if chunks:
+            vectorstore.add_documents(chunks, ids=chunk_ids)
+            bm25_util.add_documents(chunk_ids, chunks)
+
+        manifest["files"][key] = {"sha256": file_hash, "chunk_ids": chunk_ids, "ingested_at": now}
+        manifest["tombstones"].pop(key, None)
+        stats["changed"] += 1
+        stats["chunks_added"] += len(chunks)
+        print(f"Loaded {file_path} ({len(chunks)} chunks)")
+
+    for key in [key for key in manifest["files"] if key not in files_on_disk]:
+        entry = manifest["files"].pop(key)
+        if entry["chunk_ids"]:
+            vectorstore.delete(ids=entry["chunk_ids"])
+            bm25_util.remove_documents(entry["chunk_ids"])
+        manifest["tombstones"][key] = dict(entry, deleted_at=now)
+        stats["removed"] += 1
+        print(f"Tombstoned {key} ({len(entry['chunk_ids'])} chunks)")
+
+    save_ingest_manifest(manifest)
+    bm25_util.save_index()
+    return stats
+
+def load_rag(directory_path, file_mask, force_rebuild=False):
     """
     Load RAG data from customs documentation directory - uses consistent Chroma settings.
-    Follows project's data loading pattern from datastore/ragData for customs documentation.
+    Only new or changed files are re-chunked and re-embedded, based on the content
+    hashes in the ingest manifest. Set force_rebuild=True to drop and rebuild the collection.
     """
     try:
-        # load the documents following project's textloader pattern
-        list_of_documents_loaded = textloader_for_files_in_directory(directory_path, file_mask)
-        
-        if not list_of_documents_loaded:
+        if not os.path.isdir(directory_path):
+            print(f"Error: '{directory_path}' is not a valid directory.")
+            return "NORAGDATA: No documents loaded - check directory path and file mask"
+        if not glob.glob(os.path.join(directory_path, file_mask)):
+            print(f"No files found matching the mask '{file_mask}' in '{directory_path}'.")
             return "NORAGDATA: No documents loaded - check directory path and file mask"
-            
-        print("Total documents loaded:", len(list_of_documents_loaded))
-        
-        # Create the text splitter
-        text_splitter = SemanticChunker(embeddings_model)
 
-        # Split the documents into smaller chunks
-        splitted_documents = text_splitter.split_documents(list_of_documents_loaded)
-        
-        # Get singleton ChromaDB client with consistent settings
-        chroma_client = get_chroma_client()
-        
-        # Try to create vector store with identical settings as retrieval - prevents instance conflicts
         try:
-            # Check if collection already exists and delete it to avoid conflicts
-            try:
-                existing_collection = chroma_client.get_collection(name=CHROMA_CONFIG["collection_name"])
-                chroma_client.delete_collection(name=CHROMA_CONFIG["collection_name"])
-                print("Existing collection deleted")
-            except Exception:
-                print("No existing collection found, proceeding with creation")
-            
-            # Create vector store with IDENTICAL settings as rag_query function
-            vectorstore = Chroma.from_documents(
-                documents=splitted_documents,
-                embedding=embeddings_model,
-                collection_name=CHROMA_CONFIG["collection_name"],
-                persist_directory=CHROMA_CONFIG["persist_directory"],
-                client=chroma_client
-            )
-            print("Vector store created successfully with consistent settings")
-            
+            stats = _ingest_changes(directory_path, file_mask, force_rebuild)
         except Exception as e:
             error_msg = str(e).lower()
-            if "instance of chroma already exists" in error_msg or "different settings" in error_msg:
-                print(f"Chroma instance conflict detected: {e}")
-                print("Resetting vector database and retrying...")
-                reset_vector_db(CHROMA_CONFIG["persist_directory"])
-                
-                # Retry with fresh client after reset - using identical settings
-                chroma_client = get_chroma_client()
-                vectorstore = Chroma.from_documents(
-                    documents=splitted_documents,
-                    embedding=embeddings_model,
-                    collection_name=CHROMA_CONFIG["collection_name"],
-                    persist_directory=CHROMA_CONFIG["persist_directory"],
-                    client=chroma_client
-                )
-                print("Vector store created after instance reset")
-            elif "tenant" in error_msg or "default_tenant" in error_msg:
-                print(f"Tenant connection error detected: {e}")
+            if ("instance of chroma already exists" in error_msg or "different settings" in error_msg
+                    or "tenant" in error_msg or "default_tenant" in error_msg):
+                print(f"Chroma error detected: {e}")
                 print("Resetting vector database and retrying...")
                 reset_vector_db(CHROMA_CONFIG["persist_directory"])
-                
-                # Retry with fresh client after reset - using identical settings
-                chroma_client = get_chroma_client()
-                vectorstore = Chroma.from_documents(
-                    documents=splitted_documents,
-                    embedding=embeddings_model,
-                    collection_name=CHROMA_CONFIG["collection_name"],
-                    persist_directory=CHROMA_CONFIG["persist_directory"],
-                    client=chroma_client
-                )
+                stats = _ingest_changes(directory_path, file_mask, force_rebuild=True)
+                print("Vector store created after reset")
             else:
                 raise e
-                
-        return f"RAG_LOADED: {len(list_of_documents_loaded)} documents processed successfully"
+
+        print(f"Ingest complete: {stats}")
+        if stats["changed"] or stats["removed"] or force_rebuild:
+            publish_collection_generation()
+        return (
+            f"RAG_LOADED: {stats['changed']} documents processed successfully "
+            f"({stats['unchanged']} unchanged, {stats['removed']} removed, {stats['chunks_added']} chunks embedded)"
+        )
         
     except Exception as e:
         print(f"Error in load_rag: {e}")
@@ -231,30 +368,9 @@ def load_rag(directory_path, file_mask):
         else:
             return f"RAG_ERROR: {str(e)}"
 
-def rag_query(user_query: str):
-    """
-    Query RAG system for customs/trade information using IDENTICAL Chroma settings as load_rag.
-    Returns markdown-formatted response following project conventions.
-    Follows project's step-by-step reasoning approach similar to tno_chatbot.py.
-    """
-    try:
-        logging.basicConfig()
-        logging.getLogger("langchain.retrievers.multi_query").setLevel(logging.INFO)
-        
-        # Get singleton ChromaDB client with consistent settings
-        chroma_client = get_chroma_client()
-        
-        # Load existing Chroma vector database with IDENTICAL settings as load_rag
-        vectordb = Chroma(
-            collection_name=CHROMA_CONFIG["collection_name"], 
-            persist_directory=CHROMA_CONFIG["persist_directory"],
-            embedding_function=embeddings_model,
-            client=chroma_client
-        )
-        
-        # Create prompt template for customs/trade domain - follows project's prompt engineering pattern
-        # Using step-by-step reasoning similar to tno_chatbot.py
-        template = """You are an assistant for question-answering tasks related to customs, trade, and Singapore customs workflows.
+# Prompt template for customs/trade domain - follows project's prompt engineering pattern
+# Using step-by-step reasoning similar to tno_chatbot.py
+RAG_PROMPT_TEMPLATE = """You are an assistant for question-answering tasks related to customs, trade, and Singapore customs workflows.
 Use the following pieces of retrieved context to answer the question.
 If you don't know the answer, say that you don't know.
 Provide step-by-step explanations in markdown format when applicable.
@@ -265,48 +381,160 @@ Context: {context}
 Question: {question}
 
 Answer:"""
-        
+
+# Confidence-driven fallback settings - tunable through environment variables
+RETRIEVAL_K = int(os.getenv("RAG_RETRIEVAL_K", "4"))
+RELEVANCE_THRESHOLD = float(os.getenv("RAG_RELEVANCE_THRESHOLD", "0.25"))
+MULTI_QUERY_VARIANTS = int(os.getenv("RAG_MULTI_QUERY_VARIANTS", "3"))
+RRF_K = 60
+
+# Shared pool for the parallel multi-query searches
+_retrieval_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """
+    Fuses several ranked document lists into one with reciprocal rank fusion.
+
+    Args:
+        ranked_lists (list): Lists of Documents, best first.
+        k (int): RRF damping constant.
+
+    Returns:
+        list: Documents ordered by fused score, duplicates merged.
+    """
+    scores = {}
+    documents = {}
+    for ranked in ranked_lists:
+        for rank, document in enumerate(ranked):
+            key = (document.metadata.get("source"), document.page_content)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+class RetrievalService:
+    """
+    Long-lived retrieval objects for one generation of the customs collection.
+    Built once and reused by every query until load_rag publishes a new index.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+        # Load existing Chroma vector database with IDENTICAL settings as load_rag
+        self.vectordb = _open_vectorstore(get_chroma_client())
         # Create classic prompt template following project's prompt_util pattern
-        prompt = PromptTemplate(
-            template=template,
+        self.prompt = PromptTemplate(
+            template=RAG_PROMPT_TEMPLATE,
             input_variables=["context", "question"]
         )
-        
-        # Create RetrievalQA chain using classic from_chain_type method - follows project pattern
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=vectordb.as_retriever(),
-            chain_type_kwargs={"prompt": prompt},
-            return_source_documents=True
-        )
-        
-        # Execute the classic chain
-        results = qa_chain({"query": user_query})
-        
-        # Follow project pattern for fallback logic when answer is uncertain
-        if "don't know" in results['result']:
-            # Use MultiQueryRetriever for enhanced retrieval - follows existing pattern
-            retriever_multiquery = MultiQueryRetriever.from_llm(
-                retriever=vectordb.as_retriever(), llm=llm
-            )
-            
-            # Create RetrievalQA with multi-query retriever using classic pattern
-            multiquery_qa = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=retriever_multiquery,
-                chain_type_kwargs={"prompt": prompt},
-                return_source_documents=True
-            )
-            
-            result = multiquery_qa({"query": user_query})
-            return "**Retrieval Multi:** " + result['result']
-        else:
+        bm25_util.load_index(BM25_INDEX_PATH)
+        print(f"Retrieval service built for collection generation {generation}")
+
+    def retrieve(self, question: str):
+        """Return [(Document, relevance_score)] for the question, best first."""
+        with trace_util.span("chroma.query", k=RETRIEVAL_K):
+            return self.vectordb.similarity_search_with_relevance_scores(question, k=RETRIEVAL_K)
+
+    def lexical_retrieve(self, question: str):
+        """Return Documents ranked by BM25 - no embedding call involved."""
+        documents = []
+        for chunk_id, _ in bm25_util.search(question, k=RETRIEVAL_K):
+            stored = bm25_util.get_document(chunk_id)
+            documents.append(Document(page_content=stored["text"], metadata=stored["metadata"]))
+        return documents
+
+    def generate_query_variants(self, question: str):
+        """One LLM call producing alternative phrasings of the question."""
+        messages = [
+            {'role': 'system', 'content': f"""
+Generate {MULTI_QUERY_VARIANTS} different versions of the user question to retrieve relevant documents
+from a vector database about customs, trade and Singapore customs workflows.
+Return one question per line - no numbering and no other text.
+"""},
+            {'role': 'user', 'content': question}
+        ]
+        response = prompt_util.get_completion_from_messages(messages, profile="extractor")
+        variants = [line.strip(" -*\t") for line in response.splitlines() if line.strip(" -*\t")]
+        return variants[:MULTI_QUERY_VARIANTS]
+
+    def multi_query_retrieve(self, question: str, first_ranking, lexical_ranking):
+        """Retrieve all variants in parallel and fuse them with the original vector and lexical rankings."""
+        variants = self.generate_query_variants(question)
+        if not variants:
+            return reciprocal_rank_fusion([[document for document, _ in first_ranking], lexical_ranking])[:RETRIEVAL_K]
+        # One batched embedding call for all variants, then the searches run side by side
+        vectors = embeddings_model.embed_documents(variants)
+        variant_rankings = list(_retrieval_executor.map(self._search_by_vector, vectors))
+        print(f"Multi-query variants: {variants}")
+        return reciprocal_rank_fusion(
+            [[document for document, _ in first_ranking], lexical_ranking] + variant_rankings
+        )[:RETRIEVAL_K]
+
+    def _search_by_vector(self, vector):
+        with trace_util.span("chroma.query", k=RETRIEVAL_K):
+            return self.vectordb.similarity_search_by_vector(vector, k=RETRIEVAL_K)
+
+    def answer(self, question: str, documents):
+        """Single answer pass over the retrieved context."""
+        context = "\n\n".join(document.page_content for document in documents)
+        messages = [
+            {'role': 'user', 'content': self.prompt.format(context=context, question=question)}
+        ]
+        return prompt_util.get_completion_from_messages(messages, profile="rag_answer")
+
+    def query(self, user_query: str):
+        lexical = self.lexical_retrieve(user_query)
+
+        # Exact identifier lookups (user ids, item codes) are answered from the lexical index alone
+        if lexical and bm25_util.exact_id_tokens(user_query):
+            return "**Retrieval Lexical:** " + self.answer(user_query, lexical)
+
+        scored = self.retrieve(user_query)
+        top_score = max((score for _, score in scored), default=0.0)
+
+        # Decide on the fallback from retrieval confidence, before any answer is generated
+        if top_score >= RELEVANCE_THRESHOLD:
+            documents = reciprocal_rank_fusion([[document for document, _ in scored], lexical])[:RETRIEVAL_K]
             # Return primary result with project's markdown response format
-            return "**Retrieval QA:** " + results['result']
+            return "**Retrieval QA:** " + self.answer(user_query, documents)
+
+        print(f"Top relevance {top_score:.2f} below {RELEVANCE_THRESHOLD} - using multi-query retrieval")
+        documents = self.multi_query_retrieve(user_query, scored, lexical)
+        return "**Retrieval Multi:** " + self.answer(user_query, documents)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _build_retrieval_service(generation):
+    """Resource-cached so every Streamlit session shares one service per collection generation."""
+    return RetrievalService(generation)
+
+def get_collection_generation():
+    """Return the generation number of the currently published collection."""
+    return _collection_generation
+
+def publish_collection_generation():
+    """Mark the collection as changed so the next query builds a fresh retrieval service."""
+    global _collection_generation
+    with _generation_lock:
+        _collection_generation += 1
+        return _collection_generation
+
+def get_retrieval_service():
+    """Return the retrieval service for the current collection generation."""
+    return _build_retrieval_service(get_collection_generation())
+
+def rag_query(user_query: str):
+    """
+    Query RAG system for customs/trade information using IDENTICAL Chroma settings as load_rag.
+    Returns markdown-formatted response following project conventions.
+    Follows project's step-by-step reasoning approach similar to tno_chatbot.py.
+    Per query this only embeds, searches and calls the LLM - the chain objects are reused.
+    """
+    try:
+        with trace_util.span("rag.query"):
+            return get_retrieval_service().query(user_query)
             
     except Exception as e:
+        # Drop the cached service so the next query rebuilds it against a fresh client
+        _build_retrieval_service.clear()
         # Follow project's error handling pattern - return specific error responses
         error_msg = str(e).lower()
         if "instance of chroma already exists" in error_msg:
@@ -0,0 +1,135 @@
+"""Typed, indexed in-memory lookups for the ragData reference tables"""
+
+import os
+import re
+import csv
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+RAG_DATA_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "ragData"))
+
+
+class UserRecord(NamedTuple):
+    user_id: str
+    user: str
+    receiver_id: str
+    mailbox: str
+
+
+class ItemRecord(NamedTuple):
+    item_no: str
+    description: str
+
+
+class PurchaseRecord(NamedTuple):
+    purchase_id: str
+    type: str
+    total_value: Optional[float]
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# table name -> (file name, key column, row builder)
+TABLES = {
+    "users": (
+        "UserIdMailboxTable.txt", "Userid",
+        lambda row: UserRecord(row["Userid"], row.get("user", ""), row.get("receiver ID", ""), row.get("mailbox", "")),
+    ),
+    "items": (
+        "ItemDetailTable.txt", "itemNo",
+        lambda row: ItemRecord(row["itemNo"], row.get("Item Description", "")),
+    ),
+    "purchases": (
+        "PurchasedTable.txt", "PurchaseID",
+        lambda row: PurchaseRecord(row["PurchaseID"], row.get("Type", ""), _to_float(row.get("totalValue"))),
+    ),
+}
+
+_lock = threading.Lock()
+# table name -> {"mtime": float, "rows": {UPPER-CASED KEY: record}}
+_tables = {}
+
+
+def _read_table(file_name: str, key_column: str, build_row) -> Dict[str, NamedTuple]:
+    """Read a ragData CSV table into a dict keyed by the upper-cased key column."""
+    path = os.path.join(RAG_DATA_PATH, file_name)
+    rows = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        # Some tables start with a free-text title line before the header
+        header_index = next(i for i, line in enumerate(lines) if key_column in line.split(","))
+        for row in csv.DictReader(lines[header_index:], skipinitialspace=True):
+            row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            if row.get(key_column):
+                rows[row[key_column].upper()] = build_row(row)
+    except (OSError, StopIteration) as e:
+        print(f"❌ Could not load reference table {file_name}: {e}")
+    return rows
+
+
+def _get_table(name: str) -> Dict[str, NamedTuple]:
+    """Return the indexed table, reloading it if the file changed on disk."""
+    file_name, key_column, build_row = TABLES[name]
+    try:
+        mtime = os.path.getmtime(os.path.join(RAG_DATA_PATH, file_name))
+    except OSError:
+        mtime = 0
+    cached = _tables.get(name)
+    if cached is None or cached["mtime"] != mtime:
+        with _lock:
+            cached = _tables.get(name)
+            if cached is None or cached["mtime"] != mtime:
+                cached = {"mtime": mtime, "rows": _read_table(file_name, key_column, build_row)}
+                _tables[name] = cached
+    return cached["rows"]
+
+
+def get_tables() -> dict:
+    """Return {"users", "items", "purchases"} -> {UPPER-CASED KEY: record}, each freshly checked."""
+    return {name: _get_table(name) for name in TABLES}
+
+
+def get_user(user_id: str) -> Optional[UserRecord]:
+    """Exact, case-insensitive lookup by Userid."""
+    return _get_table("users").get(str(user_id or "").strip().upper())
+
+
+def get_item(item_no: str) -> Optional[ItemRecord]:
+    """Exact lookup by itemNo."""
+    return _get_table("items").get(str(item_no or "").strip().upper())
+
+
+def get_purchase(purchase_id: str) -> Optional[PurchaseRecord]:
+    """Exact lookup by PurchaseID."""
+    return _get_table("purchases").get(str(purchase_id or "").strip().upper())
+
+
+def is_registered_mailbox(user_id: str, mailbox_id: Optional[str] = None) -> bool:
+    """True if the user id exists and, when given, the mailbox matches the registered one."""
+    user = get_user(user_id)
+    if user is None:
+        return False
+    return not mailbox_id or mailbox_id.strip().upper() == user.mailbox.upper()
+
+
+# Exact lookup per table, in the order find_records_in_text reports matches
+_LOOKUPS = (get_user, get_item, get_purchase)
+
+
+def find_records_in_text(text: str) -> List[NamedTuple]:
+    """Return every reference record whose key appears as a whole token in the text."""
+    tokens = sorted(set(re.findall(r"[A-Za-z0-9_]+", text.upper())))
+    records = []
+    for lookup in _LOOKUPS:
+        records.extend(record for record in map(lookup, tokens) if record is not None)
+    return records
@@ -0,0 +1,388 @@
+"""Compiles shoppingrules.txt into executable checks over parsed declarations"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+from helper import xml_util
+from helper import reference_table_util
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+RAG_DATA_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "ragData"))
+RULES_FILE_PATH = os.path.join(RAG_DATA_PATH, "shoppingrules.txt")
+
+PASS = "PASS"
+REJECT = "REJECT"
+NOT_EVALUATED = "NOT_EVALUATED"
+
+DEFAULT_FINAL_OUTCOME = "Good to Buy"
+
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_RESTRICTED_PLACES = {"A", "B", "C"}
+_CHANGE_TYPES = {"REFUND", "CHG"}
+_RETURN_INDICATORS = {"RETURN", "REFUND"}
+
+
+@dataclass
+class Rule:
+    """One Trace Log / Condition / Outcome block from the rules document."""
+    trace_log: str
+    condition: str
+    action: str
+    reason: str
+    explanation: str = ""
+    section: str = ""
+    check: Optional["CompiledCheck"] = None
+
+
+@dataclass
+class RuleResult:
+    trace_log: str
+    status: str
+    reason: str = ""
+    detail: str = ""
+
+
+@dataclass
+class ValidationReport:
+    results: List[RuleResult] = field(default_factory=list)
+    final_outcome: str = DEFAULT_FINAL_OUTCOME
+
+    @property
+    def rejected(self) -> bool:
+        return any(result.status == REJECT for result in self.results)
+
+    @property
+    def rejection_reasons(self) -> List[str]:
+        return [result.reason for result in self.results if result.status == REJECT]
+
+
+@dataclass
+class CompiledCheck:
+    """
+    A rule condition compiled to code. `scalar` evaluates one declaration and
+    `vector` evaluates a DataFrame of declarations; both return True where the
+    condition holds, i.e. where the rule's outcome fires.
+    """
+    scalar: Callable[[xml_util.Declaration, dict], bool]
+    vector: Callable[[pd.DataFrame, dict], pd.Series]
+
+
+# --- Scalar helpers ---
+
+def _filled(value) -> bool:
+    return value is not None and str(value).strip() != ""
+
+
+def _upper(value) -> str:
+    return str(value).strip().upper() if _filled(value) else ""
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _in_sequence(sequence_numbers: List[str]) -> bool:
+    numbers = [_to_int(number) for number in sequence_numbers]
+    if any(number is None for number in numbers):
+        return False
+    return all(later == earlier + 1 for earlier, later in zip(numbers, numbers[1:]))
+
+
+def _is_registered(user_id, mailbox_id, tables: dict) -> bool:
+    user = tables["users"].get(_upper(user_id))
+    if user is None:
+        return False
+    return not _filled(mailbox_id) or _upper(mailbox_id) == _upper(user.mailbox)
+
+
+def _latest_purchase_type(declaration: xml_util.Declaration, tables: dict) -> Optional[str]:
+    purchase = tables["purchases"].get(_upper(declaration.extra_fields.get("purchaseid")))
+    return purchase.type if purchase else None
+
+
+# --- Vector helpers ---
+
+def _filled_series(series: pd.Series) -> pd.Series:
+    return series.fillna("").astype(str).str.strip() != ""
+
+
+def _upper_series(series: pd.Series) -> pd.Series:
+    return series.fillna("").astype(str).str.strip().str.upper()
+
+
+def _bad_date_series(series: pd.Series) -> pd.Series:
+    return _filled_series(series) & ~series.fillna("").astype(str).str.strip().str.match(_DATE_PATTERN.pattern)
+
+
+# --- Compiled conditions, keyed by the normalised outcome reason in shoppingrules.txt ---
+
+_CHECKS = {
+    "wrong date format": CompiledCheck(
+        scalar=lambda d, t: any(
+            _filled(value) and not _DATE_PATTERN.match(str(value).strip())
+            for value in (d.submission_date, d.date_of_departure)
+        ),
+        vector=lambda df, t: _bad_date_series(df["submission_date"]) | _bad_date_series(df["date_of_departure"]),
+    ),
+    "place missing": CompiledCheck(
+        scalar=lambda d, t: _upper(d.place) in _RESTRICTED_PLACES and not _filled(d.address),
+        vector=lambda df, t: _upper_series(df["place"]).isin(_RESTRICTED_PLACES) & ~_filled_series(df["address"]),
+    ),
+    "no user id": CompiledCheck(
+        scalar=lambda d, t: not _filled(d.user_id),
+        vector=lambda df, t: ~_filled_series(df["user_id"]),
+    ),
+    "no type": CompiledCheck(
+        scalar=lambda d, t: not _filled(d.type),
+        vector=lambda df, t: ~_filled_series(df["type"]),
+    ),
+    "invalid user id mailbox": CompiledCheck(
+        scalar=lambda d, t: _filled(d.user_id) and not _is_registered(d.user_id, d.mailbox_id, t),
+        vector=lambda df, t: _filled_series(df["user_id"]) & ~(
+            _upper_series(df["user_id"]).isin(t["users"].keys()) & (
+                ~_filled_series(df["mailbox_id"])
+                | (_upper_series(df["mailbox_id"]) == _upper_series(df["user_id"]).map(
+                    {key: _upper(user.mailbox) for key, user in t["users"].items()}
+                ))
+            )
+        ),
+    ),
+    "serial number not in order": CompiledCheck(
+        scalar=lambda d, t: _upper(d.change_indicator) not in _CHANGE_TYPES and not _in_sequence(d.sequence_numbers),
+        vector=lambda df, t: ~_upper_series(df["change_indicator"]).isin(_CHANGE_TYPES)
+            & ~df["sequence_numbers"].map(_in_sequence).astype(bool),
+    ),
+    "total count of items is wrong in purchase": CompiledCheck(
+        scalar=lambda d, t: _filled(d.total_item_number)
+            and _upper(d.change_indicator) not in _RETURN_INDICATORS
+            and _to_int(d.total_item_number) != len(d.carts),
+        vector=lambda df, t: _filled_series(df["total_item_number"])
+            & ~_upper_series(df["change_indicator"]).isin(_RETURN_INDICATORS)
+            & (pd.to_numeric(df["total_item_number"], errors="coerce") != df["carts"].map(len)),
+    ),
+    "refund total count of items is wrong in purchase": CompiledCheck(
+        scalar=lambda d, t: _filled(d.total_item_number)
+            and _upper(d.change_indicator) in _RETURN_INDICATORS
+            and _to_int(d.total_item_number) != len(d.carts),
+        vector=lambda df, t: _filled_series(df["total_item_number"])
+            & _upper_series(df["change_indicator"]).isin(_RETURN_INDICATORS)
+            & (pd.to_numeric(df["total_item_number"], errors="coerce") != df["carts"].map(len)),
+    ),
+    "invalid cart sequence number": CompiledCheck(
+        scalar=lambda d, t: any(
+            "cartnumberitemname" in cart and ((_to_int(cart.get("sequencenumber")) or 0) <= 0)
+            for cart in d.carts
+        ),
+        vector=lambda df, t: df["carts"].map(
+            lambda carts: any(
+                "cartnumberitemname" in cart and ((_to_int(cart.get("sequencenumber")) or 0) <= 0)
+                for cart in carts
+            )
+        ).astype(bool),
+    ),
+    "purchase reference (purchase record id)": CompiledCheck(
+        scalar=lambda d, t: _upper(d.change_indicator) == "RETURN"
+            and _latest_purchase_type(d, t) is not None
+            and _upper(d.type) != _upper(_latest_purchase_type(d, t)),
+        vector=lambda df, t: (_upper_series(df["change_indicator"]) == "RETURN") & (
+            lambda latest: latest.notna() & (_upper_series(df["type"]) != _upper_series(latest))
+        )(df["extra_fields"].map(
+            lambda extra: getattr(t["purchases"].get(_upper(extra.get("purchaseid"))), "type", None)
+        )),
+    ),
+}
+
+
+def _normalise_reason(reason: str) -> str:
+    return re.sub(r"\s+", " ", reason).strip().casefold()
+
+
+# --- Rules document parsing ---
+
+def parse_rules(text: str) -> tuple:
+    """
+    Parses the rules document into Rule records.
+
+    Returns:
+        tuple: (list of Rule, final outcome text used when nothing is rejected)
+    """
+    rules = []
+    final_outcome = DEFAULT_FINAL_OUTCOME
+    section = ""
+    current = {}
+
+    def flush():
+        if "trace_log" in current and "outcome" in current:
+            action, _, reason = current["outcome"].partition(":")
+            rules.append(Rule(
+                trace_log=current["trace_log"],
+                condition=current.get("condition", ""),
+                action=action.strip().upper(),
+                reason=reason.strip(),
+                explanation=current.get("explanation", ""),
+                section=section,
+            ))
+        current.clear()
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        lowered = line.casefold()
+        if re.match(r"^[IVX]+\.\s", line):
+            flush()
+            section = line
+        elif lowered.startswith("trace log:"):
+            flush()
+            current["trace_log"] = line.split(":", 1)[1].strip()
+        elif lowered.startswith("condition:"):
+            current["condition"] = line.split(":", 1)[1].strip()
+        elif lowered.startswith("outcome:"):
+            current["outcome"] = line.split(":", 1)[1].strip()
+        elif lowered.startswith("detailed explanation:"):
+            current["explanation"] = line.split(":", 1)[1].strip()
+        elif "date format" in lowered and "reject with" in lowered:
+            # Global rule stated in the preamble rather than as a Trace Log block
+            reason = re.split(r"reject with", line, flags=re.IGNORECASE)[1].strip()
+            rules.append(Rule(
+                trace_log="Check Date Format", condition=line, action=REJECT, reason=reason, section="General",
+            ))
+        elif lowered.startswith("if there are no rejection"):
+            final_outcome = re.split(r"return to", line, flags=re.IGNORECASE)[-1].strip() or DEFAULT_FINAL_OUTCOME
+    flush()
+    return rules, final_outcome
+
+
+def compile_rules(rules: List[Rule]) -> List[Rule]:
+    """Attach a compiled check to every REJECT rule whose condition the engine can evaluate."""
+    for rule in rules:
+        if rule.action == REJECT:
+            rule.check = _CHECKS.get(_normalise_reason(rule.reason))
+    return rules
+
+
+# Compiled rule set - recompiled when shoppingrules.txt changes on disk
+_lock = threading.Lock()
+_compiled = {"mtime": None, "rules": [], "final_outcome": DEFAULT_FINAL_OUTCOME}
+
+
+def get_compiled_rules() -> tuple:
+    """
+    Return (rules, final_outcome, tables), recompiling if the rules file changed.
+    Tables come from reference_table_util, which reloads each table when its file changes.
+    """
+    try:
+        mtime = os.path.getmtime(RULES_FILE_PATH)
+    except OSError:
+        mtime = 0
+    if mtime != _compiled["mtime"]:
+        with _lock:
+            if mtime != _compiled["mtime"]:
+                try:
+                    with open(RULES_FILE_PATH, encoding="utf-8") as file:
+                        rules, final_outcome = parse_rules(file.read())
+                except OSError as e:
+                    print(f"❌ Could not read rules from {RULES_FILE_PATH}: {e}")
+                    rules, final_outcome = [], DEFAULT_FINAL_OUTCOME
+                _compiled["rules"] = compile_rules(rules)
+                _compiled["final_outcome"] = final_outcome
+                _compiled["mtime"] = mtime
+                compiled_count = sum(1 for rule in rules if rule.check is not None)
+                print(f"✅ Compiled {compiled_count} of {len(rules)} shopping rules")
+    return _compiled["rules"], _compiled["final_outcome"], reference_table_util.get_tables()
+
+
+# --- Evaluation ---
+
+def validate_declaration(declaration: xml_util.Declaration) -> ValidationReport:
+    """
+    Evaluates every rule against one declaration.
+
+    Rules are grouped by Trace Log; a group fails if any of its REJECT rules fires.
+    Groups whose conditions could not be compiled are reported as NOT_EVALUATED.
+    """
+    rules, final_outcome, tables = get_compiled_rules()
+    report = ValidationReport(final_outcome=final_outcome)
+    groups = {}
+    for rule in rules:
+        groups.setdefault(rule.trace_log, []).append(rule)
+
+    for trace_log, group in groups.items():
+        checks = [rule for rule in group if rule.check is not None]
+        if not checks:
+            report.results.append(RuleResult(
+                trace_log, NOT_EVALUATED, detail="declaration does not capture the fields this rule needs"
+            ))
+            continue
+        fired = [rule for rule in checks if rule.check.scalar(declaration, tables)]
+        if fired:
+            report.results.append(RuleResult(trace_log, REJECT, reason=fired[0].reason, detail=fired[0].condition))
+        else:
+            report.results.append(RuleResult(trace_log, PASS))
+    return report
+
+
+def declarations_to_frame(declarations: List[xml_util.Declaration]) -> pd.DataFrame:
+    """Build the column-per-field frame used by validate_declarations_frame()."""
+    return pd.DataFrame([asdict(declaration) for declaration in declarations])
+
+
+def validate_declarations_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized validation of many declarations at once.
+
+    Args:
+        frame (pd.DataFrame): One row per declaration, built by declarations_to_frame().
+
+    Returns:
+        pd.DataFrame: One boolean column per compiled rule (True = rejected), plus
+                      'rejected' and 'first_rejection_reason' columns.
+    """
+    rules, final_outcome, tables = get_compiled_rules()
+    results = pd.DataFrame(index=frame.index)
+    first_reason = pd.Series(final_outcome, index=frame.index, dtype=object)
+    rejected = pd.Series(False, index=frame.index)
+
+    for rule in rules:
+        if rule.check is None:
+            continue
+        fired = rule.check.vector(frame, tables).fillna(False).astype(bool)
+        results[rule.reason] = fired
+        first_reason = first_reason.where(~(fired & ~rejected), rule.reason)
+        rejected = rejected | fired
+
+    results["rejected"] = rejected
+    results["first_rejection_reason"] = first_reason
+    return results
+
+
+def format_trace_log(report: ValidationReport) -> str:
+    """Render the validation report as the markdown trace log used in officer replies."""
+    icons = {PASS: "✅", REJECT: "❌", NOT_EVALUATED: "➖"}
+    lines = []
+    for index, result in enumerate(report.results, start=1):
+        if result.status == REJECT:
+            lines.append(f"{index}. {icons[REJECT]} **{result.trace_log}** - REJECT: {result.reason}")
+        elif result.status == PASS:
+            lines.append(f"{index}. {icons[PASS]} **{result.trace_log}** - PASS")
+        else:
+            lines.append(f"{index}. {icons[NOT_EVALUATED]} **{result.trace_log}** - not evaluated ({result.detail})")
+
+    if report.rejected:
+        lines.append("")
+        lines.append("**Status:** ❌ REJECTED")
+        lines.append("**Reason:** " + "; ".join(report.rejection_reasons))
+    else:
+        lines.append("")
+        lines.append("**Status:** ✅ APPROVED")
+        lines.append(f"**Reason:** {report.final_outcome}")
+    return "\n".join(lines)
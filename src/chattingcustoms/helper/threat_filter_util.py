@@ -0,0 +1,221 @@
+"""Local pre-filter that classifies obvious threat queries before the LLM threat check"""
+
+import os
+import csv
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from helper import incident_store_util
+
+# Get the root directory path relative to this script location
+# This script is in src/chattingcustoms/helper/, so go up 3 levels to reach project root
+_script_directory = os.path.dirname(os.path.abspath(__file__))
+_root_directory = os.path.join(_script_directory, "..", "..", "..")
+THREAT_TERMS_PATH = os.path.abspath(os.path.join(_root_directory, "datastore", "appData", "threatTerms.csv"))
+
+# When True, queries that match no term at all are classified as "None" locally.
+# Off by default: a term list cannot clear a query, so every non-hit still goes to
+# the LLM and only strong hits are decided locally.
+LOCAL_NON_HIT_ENABLED = os.getenv("THREAT_FILTER_LOCAL_NON_HIT", "false").casefold() == "true"
+
+# Logged queries longer than this are only used for exact repeats, not as search patterns
+MAX_LOGGED_PATTERN_WORDS = 6
+
+_VERDICT_HIT = "hit"
+_VERDICT_CLEAR = "clear"
+_VERDICT_AMBIGUOUS = "ambiguous"
+
+# Logged verdict values that mean the query was not a threat (false positives)
+_NEGATIVE_VALUES = {"", "no", "none", "false", "n/a"}
+
+
+class AhoCorasick:
+    """Multi-pattern matcher - finds every pattern occurrence in a single pass over the text."""
+
+    def __init__(self, patterns: List[str]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, text: str):
+        """Yield (start_index, pattern) for every occurrence of any pattern in text."""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield index - len(pattern) + 1, pattern
+
+
+def normalize_query(text: str) -> str:
+    """Lower-case and collapse whitespace so repeats match regardless of formatting."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _is_word_boundary(text: str, start: int, end: int) -> bool:
+    """True if text[start:end] is a whole word, allowing a plural 's' suffix."""
+    if end < len(text) and text[end] == "s":
+        end += 1
+    before_ok = start == 0 or not text[start - 1].isalnum()
+    after_ok = end >= len(text) or not text[end].isalnum()
+    return before_ok and after_ok
+
+
+# Index state - rebuilt when the term list or the incident store changes
+_lock = threading.Lock()
+_index = {
+    "signature": None,
+    "matcher": None,
+    "patterns": {},
+    "logged_queries": {},
+}
+
+
+def _file_signature(path: str) -> Tuple[float, int]:
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime, stat.st_size)
+    except OSError:
+        return (0, 0)
+
+
+def _load_terms() -> Dict[str, Tuple[str, str, str]]:
+    terms = {}
+    try:
+        with open(THREAT_TERMS_PATH, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                term = normalize_query(row.get("term") or "")
+                if term:
+                    terms[term] = (row["threat_category"], row["threat_category_value"], row["strength"].strip().casefold())
+    except OSError as e:
+        print(f"❌ Could not read threat terms from {THREAT_TERMS_PATH}: {e}")
+    return terms
+
+
+def _load_logged_queries() -> Dict[str, Tuple[str, str]]:
+    logged = {}
+    try:
+        incidents = incident_store_util.query_incidents(columns=["query", "threat_category", "threat_category_value"])
+    except Exception as e:
+        print(f"❌ Could not read logged incidents from {incident_store_util.INCIDENT_DB_PATH}: {e}")
+        return logged
+    for query, category, value in incidents.itertuples(index=False):
+        query = normalize_query(query or "")
+        category = (category or "").strip()
+        value = (value or "").strip()
+        if query and category and category.casefold() != "none" and value.casefold() not in _NEGATIVE_VALUES:
+            logged[query] = (category, value)
+    return logged
+
+
+def _store_signature() -> tuple:
+    try:
+        return incident_store_util.get_data_version()
+    except Exception as e:
+        print(f"❌ Could not read the incident store version: {e}")
+        return (0, 0)
+
+
+def _refresh_index() -> None:
+    """Rebuild the matcher if the incident store or threatTerms.csv changed since the last build."""
+    signature = (_store_signature(), _file_signature(THREAT_TERMS_PATH))
+    if signature == _index["signature"]:
+        return
+    with _lock:
+        if signature == _index["signature"]:
+            return
+        patterns = {}
+        for term, (category, value, strength) in _load_terms().items():
+            patterns[term] = (category, value, strength)
+        logged_queries = _load_logged_queries()
+        for query, (category, value) in logged_queries.items():
+            if len(query.split()) <= MAX_LOGGED_PATTERN_WORDS and query not in patterns:
+                patterns[query] = (category, value, "strong")
+
+        _index["matcher"] = AhoCorasick(list(patterns.keys()))
+        _index["patterns"] = patterns
+        _index["logged_queries"] = logged_queries
+        _index["signature"] = signature
+        print(f"✅ Threat pre-filter built with {len(patterns)} patterns and {len(logged_queries)} logged queries")
+
+
+def classify_query(user_query: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Classifies a query against the local threat index.
+
+    Args:
+        user_query (str): The user's chat message.
+
+    Returns:
+        tuple: (verdict, threat_category, threat_category_value) where verdict is
+               "hit" for a clear threat, "clear" for a clear non-threat and
+               "ambiguous" when the LLM has to decide.
+    """
+    _refresh_index()
+    text = normalize_query(user_query)
+
+    logged = _index["logged_queries"].get(text)
+    if logged is not None:
+        return (_VERDICT_HIT, logged[0], logged[1])
+
+    weak_match = None
+    for start, pattern in _index["matcher"].search(text):
+        if not _is_word_boundary(text, start, start + len(pattern)):
+            continue
+        category, value, strength = _index["patterns"][pattern]
+        if strength == "strong":
+            return (_VERDICT_HIT, category, value)
+        weak_match = weak_match or (category, value)
+
+    if weak_match is not None or not LOCAL_NON_HIT_ENABLED:
+        return (_VERDICT_AMBIGUOUS, None, None)
+    return (_VERDICT_CLEAR, "None", "None")
+
+
+def local_threat_assessment(user_query: str) -> Optional[dict]:
+    """
+    Returns the threat assessment in the same shape as the LLM answer, or None
+    if the query is ambiguous and must be escalated to the LLM.
+    """
+    verdict, category, value = classify_query(user_query)
+    if verdict == _VERDICT_AMBIGUOUS:
+        return None
+    return {
+        "chattingcustoms": {
+            "threat_category": category,
+            "threat_category_value": value,
+        }
+    }
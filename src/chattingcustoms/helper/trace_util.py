@@ -0,0 +1,251 @@
+"""Per-stage latency and token tracing with JSONL and Prometheus-text export"""
+
+import os
+import json
+import time
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").casefold() == "true"
+# Most recent spans kept in memory for the Performance view and /metrics
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+# When set, every finished span is also appended to this JSONL file
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH") or None
+# When set, start_metrics_server() serves Prometheus text on this port
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))
+
+METRIC_PREFIX = "chattingcustoms"
+QUANTILES = (0.5, 0.95)
+
+
+@dataclass
+class Span:
+    stage: str
+    started_at: str
+    duration_seconds: float = 0.0
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    error: Optional[str] = None
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+
+_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+# Cumulative totals since process start - never shrink when old spans leave the buffer,
+# so Prometheus counters and summary _sum/_count stay monotonic
+_duration_totals: Dict[str, List[float]] = {}   # stage -> [sum_seconds, count]
+_error_totals: Dict[str, int] = {}
+_token_totals: Dict[tuple, int] = {}             # (stage, model, kind) -> tokens
+_lock = threading.Lock()
+_jsonl_lock = threading.Lock()
+_metrics_server = None
+
+
+@contextmanager
+def span(stage: str, model: Optional[str] = None, **attributes):
+    """
+    Times the enclosed block as one span. The yielded Span can be updated inside
+    the block, e.g. with token counts once the response is known.
+
+    Args:
+        stage (str): Stage name, e.g. 'llm.completion' or 'chroma.query'.
+        model (str, optional): Model used by the stage.
+        **attributes: Extra values stored with the span.
+    """
+    current = Span(
+        stage=stage, model=model, attributes=attributes,
+        started_at=datetime.datetime.now().isoformat(timespec="milliseconds"),
+    )
+    if not TRACING_ENABLED:
+        yield current
+        return
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_seconds = time.perf_counter() - started
+        record(current)
+
+
+def set_usage(current: Span, usage) -> None:
+    """Copy prompt/completion token counts from an OpenAI usage object onto a span."""
+    if usage is not None:
+        current.prompt_tokens = getattr(usage, "prompt_tokens", None)
+        current.completion_tokens = getattr(usage, "completion_tokens", None)
+
+
+def record(finished: Span) -> None:
+    """Store a finished span and append it to the JSONL file if one is configured."""
+    with _lock:
+        _spans.append(finished)
+        totals = _duration_totals.setdefault(finished.stage, [0.0, 0])
+        totals[0] += finished.duration_seconds
+        totals[1] += 1
+        if finished.error:
+            _error_totals[finished.stage] = _error_totals.get(finished.stage, 0) + 1
+        for kind, count in (("prompt", finished.prompt_tokens), ("completion", finished.completion_tokens)):
+            if count:
+                key = (finished.stage, finished.model or "", kind)
+                _token_totals[key] = _token_totals.get(key, 0) + count
+    if TRACE_JSONL_PATH:
+        line = json.dumps(asdict(finished), default=str)
+        try:
+            with _jsonl_lock, open(TRACE_JSONL_PATH, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+        except OSError as e:
+            print(f"❌ Could not write trace span to {TRACE_JSONL_PATH}: {e}")
+
+
+def get_spans() -> List[Span]:
+    """Return a copy of the buffered spans, oldest first."""
+    with _lock:
+        return list(_spans)
+
+
+def clear() -> None:
+    """Empty the span buffer; the cumulative Prometheus counters are kept."""
+    with _lock:
+        _spans.clear()
+
+
+def spans_to_jsonl() -> str:
+    """Return the buffered spans as JSONL text, one span per line."""
+    return "".join(json.dumps(asdict(finished), default=str) + "\n" for finished in get_spans())
+
+
+def export_jsonl(file_path: str) -> int:
+    """
+    Writes the buffered spans to a JSONL file, one span per line.
+
+    Returns:
+        int: Number of spans written.
+    """
+    text = spans_to_jsonl()
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    return text.count("\n")
+
+
+def stage_summary() -> Dict[str, dict]:
+    """
+    Aggregates buffered spans per stage.
+
+    Returns:
+        Dict[str, dict]: stage -> count, errors, mean/p50/p95/max seconds and token totals.
+    """
+    by_stage: Dict[str, List[Span]] = {}
+    for finished in get_spans():
+        by_stage.setdefault(finished.stage, []).append(finished)
+
+    summary = {}
+    for stage, spans in sorted(by_stage.items()):
+        durations = np.array([finished.duration_seconds for finished in spans])
+        summary[stage] = {
+            "count": len(spans),
+            "errors": sum(1 for finished in spans if finished.error),
+            "mean_seconds": float(durations.mean()),
+            "p50_seconds": float(np.percentile(durations, 50)),
+            "p95_seconds": float(np.percentile(durations, 95)),
+            "max_seconds": float(durations.max()),
+            "prompt_tokens": sum(finished.prompt_tokens or 0 for finished in spans),
+            "completion_tokens": sum(finished.completion_tokens or 0 for finished in spans),
+        }
+    return summary
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    """
+    Render spans in the Prometheus text exposition format. Quantiles cover the
+    recent spans in the buffer; _sum, _count, errors and tokens are cumulative.
+    """
+    by_stage: Dict[str, List[float]] = {}
+    for finished in get_spans():
+        by_stage.setdefault(finished.stage, []).append(finished.duration_seconds)
+    with _lock:
+        duration_totals = {stage: tuple(totals) for stage, totals in _duration_totals.items()}
+        errors = dict(_error_totals)
+        tokens = dict(_token_totals)
+
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_duration_seconds Duration of traced stages (quantiles over recent spans).",
+        f"# TYPE {METRIC_PREFIX}_stage_duration_seconds summary",
+    ]
+    for stage, (total_seconds, count) in sorted(duration_totals.items()):
+        if stage in by_stage:
+            values = np.array(by_stage[stage])
+            for quantile in QUANTILES:
+                lines.append(
+                    f'{METRIC_PREFIX}_stage_duration_seconds{{stage="{_label(stage)}",quantile="{quantile}"}} '
+                    f"{float(np.quantile(values, quantile)):.6f}"
+                )
+        lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{_label(stage)}"}} {total_seconds:.6f}')
+        lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{_label(stage)}"}} {count}')
+
+    lines.append(f"# HELP {METRIC_PREFIX}_stage_errors_total Traced stages that raised.")
+    lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+    for stage, count in sorted(errors.items()):
+        lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{_label(stage)}"}} {count}')
+
+    lines.append(f"# HELP {METRIC_PREFIX}_tokens_total Prompt and completion tokens.")
+    lines.append(f"# TYPE {METRIC_PREFIX}_tokens_total counter")
+    for (stage, model, kind), count in sorted(tokens.items()):
+        lines.append(
+            f'{METRIC_PREFIX}_tokens_total{{stage="{_label(stage)}",model="{_label(model)}",kind="{kind}"}} {count}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int = TRACE_METRICS_PORT, host: str = "127.0.0.1"):
+    """
+    Serves /metrics in Prometheus text format on a daemon thread. Safe to call
+    on every Streamlit rerun - only the first call starts the server.
+
+    Returns:
+        ThreadingHTTPServer or None: The server, or None if no port is configured.
+    """
+    global _metrics_server
+    if not port:
+        return None
+    with _lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"❌ Could not start metrics server on {host}:{port}: {e}")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="trace-metrics", daemon=True).start()
+            print(f"✅ Serving trace metrics on http://{host}:{port}/metrics")
+    return _metrics_server
@@ -0,0 +1,236 @@
+"""Tolerant local parser for XML-like trade declarations"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Tag -> (record attribute, display label). Mirrors extraction_list in tno_chatbot.py
+DECLARATION_TAGS = {
+    "submissiondate": ("submission_date", "Date Of Submission"),
+    "dateofdeparture": ("date_of_departure", "Date Of Departure"),
+    "place": ("place", "Place"),
+    "address": ("address", "Address"),
+    "changeindicator": ("change_indicator", "Change Indicator"),
+    "carts": ("carts", "Cart Information"),
+    "cartnumberinformation": ("cart_number_information", "Cart Number Information"),
+    "sequencenumber": ("sequence_number", "Sequence Number"),
+    "userid": ("user_id", "User ID"),
+    "type": ("type", "Transaction Type"),
+    "actioncode": ("action_code", "Action Code"),
+    "mailboxid": ("mailbox_id", "Mailbox ID"),
+}
+
+# Optional tags that are parsed when present but never reported as missing
+OPTIONAL_TAGS = {
+    "totalitemnumber": ("total_item_number", "Total Number Of Items"),
+}
+
+# Alternative spellings seen in real submissions
+TAG_ALIASES = {
+    "dateofsubmission": "submissiondate",
+    "buyid": "userid",
+    "cartinformation": "carts",
+    "mailbox": "mailboxid",
+}
+
+_CART_CONTAINERS = {"carts"}
+_CART_ENTRIES = {"cartnumberinformation", "cart"}
+
+_TAG_PATTERN = re.compile(r"<\s*(/?)\s*([A-Za-z_][\w.-]*)\s*(/?)\s*>")
+# A closing tag cut off before its '>', e.g. the '</type' in '<type>a</type'
+_TRUNCATED_CLOSING_PATTERN = re.compile(r"<\s*/\s*[A-Za-z_][\w.-]*\s*(?=<|$)")
+
+# Without a single properly closed recognised tag, at least this many recognised fields
+# must hold values before the text counts as a declaration. Keeps prose such as
+# "what does the <type> tag mean?" on the LLM path.
+MIN_UNCLOSED_FIELDS = 2
+
+
+@dataclass
+class Declaration:
+    """Typed record of the fields extracted from an XML-like declaration."""
+    submission_date: Optional[str] = None
+    date_of_departure: Optional[str] = None
+    place: Optional[str] = None
+    address: Optional[str] = None
+    change_indicator: Optional[str] = None
+    carts: List[Dict[str, str]] = field(default_factory=list)
+    cart_number_information: Optional[str] = None
+    sequence_number: Optional[str] = None
+    user_id: Optional[str] = None
+    type: Optional[str] = None
+    action_code: Optional[str] = None
+    mailbox_id: Optional[str] = None
+    total_item_number: Optional[str] = None
+    sequence_numbers: List[str] = field(default_factory=list)
+    extra_fields: Dict[str, str] = field(default_factory=dict)
+    missing_fields: List[str] = field(default_factory=list)
+
+
+class _Element:
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.text_parts = []
+        self.children = []
+        self.closed = False
+
+    @property
+    def text(self) -> str:
+        return _clean_value("".join(self.text_parts))
+
+
+def _clean_value(value: str) -> str:
+    """Strip whitespace and stray angle brackets left by malformed markup like <cart>handgun></cart>."""
+    return value.strip().strip("<>").strip()
+
+
+def _canonical_tag(tag: str) -> str:
+    tag = tag.casefold()
+    return TAG_ALIASES.get(tag, tag)
+
+
+def _build_tree(text: str) -> Optional[_Element]:
+    """
+    Builds an element tree, tolerating unclosed tags, unmatched closing tags,
+    truncated closing tags and stray angle brackets. Returns None if the text
+    contains no tags.
+    """
+    text = _TRUNCATED_CLOSING_PATTERN.sub(lambda match: match.group(0).rstrip() + ">", text)
+    root = _Element("#root")
+    stack = [root]
+    position = 0
+    found_tag = False
+
+    for match in _TAG_PATTERN.finditer(text):
+        found_tag = True
+        stack[-1].text_parts.append(text[position:match.start()])
+        position = match.end()
+        is_closing, tag, self_closing = match.group(1), _canonical_tag(match.group(2)), match.group(3)
+
+        if is_closing:
+            # Close the nearest matching open tag; ignore closing tags that were never opened
+            for depth in range(len(stack) - 1, 0, -1):
+                if stack[depth].tag == tag:
+                    stack[depth].closed = True
+                    del stack[depth:]
+                    break
+        else:
+            # An open leaf that already holds a value was never closed properly
+            # (e.g. <submissiondate>22</submissionddat>) - close it before its sibling opens
+            if len(stack) > 1 and not stack[-1].children and stack[-1].text:
+                stack.pop()
+            element = _Element(tag)
+            stack[-1].children.append(element)
+            if not self_closing:
+                stack.append(element)
+
+    stack[-1].text_parts.append(text[position:])
+    return root if found_tag else None
+
+
+def _iter_elements(element: _Element, inside_cart: bool = False):
+    """Yield (element, inside_cart) depth-first; inside_cart is True for cart entries and their children."""
+    for child in element.children:
+        child_inside_cart = inside_cart or child.tag in _CART_ENTRIES
+        yield child, child_inside_cart
+        yield from _iter_elements(child, child_inside_cart)
+
+
+def _collect_carts(root: _Element) -> List[Dict[str, str]]:
+    carts = []
+    for element, _ in _iter_elements(root):
+        if element.tag not in _CART_ENTRIES:
+            continue
+        if element.children:
+            entry = {child.tag: child.text for child in element.children if not child.children}
+        else:
+            entry = {element.tag: element.text}
+        if any(entry.values()):
+            carts.append(entry)
+    return carts
+
+
+def contains_xml_tags(text: str) -> bool:
+    """True if the text contains at least one XML-like tag."""
+    return _TAG_PATTERN.search(text) is not None
+
+
+def parse_declaration(text: str) -> Optional[Declaration]:
+    """
+    Parses an XML-like trade declaration without calling the LLM.
+
+    Args:
+        text (str): The user's query, possibly with surrounding prose.
+
+    Returns:
+        Optional[Declaration]: The parsed record with its missing_fields list, or None
+                               if the text contains no recognised declaration tags, or
+                               too little well-formed markup to tell it from prose.
+    """
+    root = _build_tree(text)
+    if root is None:
+        return None
+
+    declaration = Declaration()
+    recognised = False
+    closed_recognised = False
+    present_tags = set()
+
+    for element, inside_cart in _iter_elements(root):
+        tag = element.tag
+        if tag in DECLARATION_TAGS or tag in OPTIONAL_TAGS or tag in _CART_ENTRIES:
+            recognised = True
+            closed_recognised = closed_recognised or element.closed
+        if tag in _CART_CONTAINERS or tag == "cartnumberinformation":
+            if element.children or element.text:
+                present_tags.add(tag)
+            continue
+        if element.children:
+            continue
+
+        value = element.text
+        if tag == "sequencenumber" and value:
+            declaration.sequence_numbers.append(value)
+
+        attribute = (DECLARATION_TAGS.get(tag) or OPTIONAL_TAGS.get(tag) or (None,))[0]
+        if attribute is None:
+            if value and not inside_cart:
+                declaration.extra_fields.setdefault(tag, value)
+            continue
+        if value and getattr(declaration, attribute) is None:
+            setattr(declaration, attribute, value)
+            present_tags.add(tag)
+
+    if not recognised or (not closed_recognised and len(present_tags) < MIN_UNCLOSED_FIELDS):
+        return None
+
+    declaration.carts = _collect_carts(root)
+    if declaration.carts:
+        present_tags.add("carts")
+        declaration.cart_number_information = "; ".join(
+            ", ".join(f"{key}={value}" for key, value in cart.items()) for cart in declaration.carts
+        )
+    declaration.missing_fields = [tag for tag in DECLARATION_TAGS if tag not in present_tags]
+    return declaration
+
+
+def format_declaration_summary(declaration: Declaration) -> str:
+    """Render the declaration as 'Field Name: value' lines, using "not provided" for missing fields."""
+    lines = []
+    for tag, (attribute, label) in list(DECLARATION_TAGS.items()) + list(OPTIONAL_TAGS.items()):
+        if tag == "carts":
+            value = "; ".join(
+                cart_value for cart in declaration.carts
+                for cart_tag, cart_value in cart.items() if cart_value and cart_tag != "sequencenumber"
+            )
+        elif tag == "sequencenumber":
+            value = ", ".join(declaration.sequence_numbers)
+        else:
+            value = getattr(declaration, attribute)
+        if not value and tag in OPTIONAL_TAGS:
+            continue
+        lines.append(f"{label}: {value if value else 'not provided'}")
+    for tag, value in declaration.extra_fields.items():
+        lines.append(f"{tag}: {value}")
+    return "\n".join(lines)
+
@@ -4,7 +4,15 @@ import pandas as pd
 from datetime import datetime, timedelta # Added timedelta
 from core import router
 from helper import rag_util
+from helper import incident_store_util
+from helper import map_util
+from helper import trace_util
+from helper import cache_util
+from helper import embedding_cache_util
+from helper import incident_util
+import io
 import os
+import time
 import altair as alt # Added Altair for the chart
 
 # --- Configuration and Setup ---
@@ -12,46 +20,46 @@ import altair as alt # Added Altair for the chart
 # Set wide layout and page title
 st.set_page_config(layout="wide", page_title="IMPEX Intelligence Hub")
 
-# Define file paths
-THREAT_DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "datastore", "appData", "threatData.csv")
-
-
 # --- Data Loading Functions ---
-def load_threat_data_fresh(file_path):        
-    """Load threat data without caching to get the latest updates."""
+@st.cache_data
+def load_threat_data_cached(cache_key, data_version, start_date=None, end_date=None, category=None, columns=None,
+                            order_by='date', descending=False, limit=None, offset=0):
+    """Query the incident store; cached per filter/page and busted by cache_key or a new data version."""
     try:
-        df = pd.read_csv(file_path)
-        # Convert 'date' column to date objects for comparison/filtering
-        df['date'] = pd.to_datetime(df['date']).dt.date
-        # Ensure numeric columns are correctly typed for map and chart
-        df['latitude'] = pd.to_numeric(df['latitude'])
-        df['longitude'] = pd.to_numeric(df['longitude'])
-        return df
+        # 'date' stays datetime64 and categories stay 'category' dtype for vectorized filtering
+        return incident_store_util.query_incidents(
+            start_date, end_date, category, columns=columns,
+            order_by=order_by, descending=descending, limit=limit, offset=offset
+        )
     except Exception as e:
         st.error(f"Error loading threat data: {e}")
         return pd.DataFrame() # Return empty DataFrame on error
 
 @st.cache_data
-def load_threat_data_cached(file_path, cache_key, file_mod_time):        
-    """Load threat data with cache that can be busted by changing cache_key or file modification time."""
+def load_threat_trend_cached(cache_key, data_version, days, end_date):
+    """Daily counts per category from the incident store rollup, cached per data version and window."""
     try:
-        if not os.path.exists(file_path):
-            st.error(f"Threat data file not found: {file_path}")
-            return pd.DataFrame()
-        
-        df = pd.read_csv(file_path)
-        # Convert 'date' column to date objects for comparison/filtering
-        df['date'] = pd.to_datetime(df['date']).dt.date
-        # Ensure numeric columns are correctly typed for map and chart
-        df['latitude'] = pd.to_numeric(df['latitude'])
-        df['longitude'] = pd.to_numeric(df['longitude'])
-        
-        # Add debug info
-        st.info(f"📁 Loaded {len(df)} records from: {file_path}")
-        return df
+        return incident_store_util.get_daily_counts(days, end_date)
     except Exception as e:
-        st.error(f"Error loading threat data: {e}")
-        return pd.DataFrame() # Return empty DataFrame on error
+        st.error(f"Error loading threat trend: {e}")
+        return pd.DataFrame()
+
+@st.cache_resource
+def get_incident_frame():
+    """Process-wide incident frame; each refresh reads only incidents added since the last one."""
+    return incident_store_util.IncidentFrame(columns=['latitude', 'longitude', 'threat_category', 'date'])
+
+@st.cache_data
+def load_threat_map_cached(cache_key, data_version, zoom):
+    """Grid-binned incident locations for the map, cached per data version and zoom level."""
+    return map_util.bin_locations(get_incident_frame().frame, zoom)
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve /metrics once per process when TRACE_METRICS_PORT is set, independent of any page."""
+    return trace_util.start_metrics_server()
+
+start_metrics_endpoint()
 
 # --- State Management ---
 
@@ -78,19 +86,44 @@ def handle_login(username, password):
     elif username and password:
         st.error("Invalid credentials.")
 
+def timed_stream(chunks, start_time, timing):
+    """Pass stream chunks through, recording time-to-first-token in `timing`."""
+    for chunk in chunks:
+        if "first_token" not in timing:
+            timing["first_token"] = time.perf_counter() - start_time
+        yield chunk
+
 def handle_chat_input(prompt):
-    """Handles the user's chat input."""
+    """Handles the user's chat input, streaming the answer as it is generated."""
 
     if prompt:
         st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.spinner("AI is thinking..."):
+        st.chat_message("user").write(prompt)
+
+        start_time = time.perf_counter()
+        timing = {}
+        with st.chat_message("assistant"):
             try:
-                ai_response = router.route_to_chatbot(prompt)
-                #ai_response = "did not think"
+                with st.spinner("AI is thinking..."):
+                    ai_response = router.route_to_chatbot(prompt, stream=True)
+                if isinstance(ai_response, str):
+                    timing["first_token"] = time.perf_counter() - start_time
+                    st.markdown(ai_response)
+                else:
+                    ai_response = st.write_stream(timed_stream(ai_response, start_time, timing))
             except Exception as e:
                 ai_response = f"**Error:** Could not connect to AI service. *Router error: {e}*"
-
-        st.session_state.messages.append({"role": "assistant", "content": ai_response})
+                st.markdown(ai_response)
+
+        total_time = time.perf_counter() - start_time
+        first_token_time = timing.get("first_token", total_time)
+        print(f"Chat turn latency - first token: {first_token_time:.2f}s, total: {total_time:.2f}s")
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": ai_response,
+            "first_token_seconds": first_token_time,
+            "total_seconds": total_time,
+        })
         st.rerun()
 
 def Load_Rag():
@@ -98,8 +131,11 @@ def Load_Rag():
     try:
         # Add your RAG loading logic here
         rag_data_path = os.path.join(os.path.dirname(__file__), "..", "..", "datastore", "ragData")
-        rag_util.load_rag(rag_data_path, '*.txt')
-        st.success("RAG data loaded successfully!")
+        load_result = rag_util.load_rag(rag_data_path, '*.txt')
+        if load_result.startswith("RAG_LOADED"):
+            st.success(f"RAG data loaded successfully! {load_result}")
+        else:
+            st.error(load_result)
         # You can add actual RAG loading implementation here
         # For example: load documents, create embeddings, etc.
     except Exception as e:
@@ -114,7 +150,7 @@ def display_threat_data_viewer():
     # Add refresh button to reload data
     col1, col2 = st.columns([3, 1])
     with col2:
-        if st.button("🔄 Refresh Data", help="Reload threat data from CSV"):
+        if st.button("🔄 Refresh Data", help="Reload threat data from the incident store"):
             # Clear cache to force reload
             if 'threat_data_cache_key' in st.session_state:
                 st.session_state.threat_data_cache_key += 1
@@ -125,34 +161,41 @@ def display_threat_data_viewer():
     # Initialize cache key if not exists
     if 'threat_data_cache_key' not in st.session_state:
         st.session_state.threat_data_cache_key = 0
+    cache_key = st.session_state.threat_data_cache_key
     
-    # Get file modification time for cache invalidation
+    # Row count + last id change whenever an incident is written, busting the cached queries
     try:
-        file_mod_time = os.path.getmtime(THREAT_DATA_FILE)
-    except OSError:
-        file_mod_time = 0
+        data_version = incident_store_util.get_data_version()
+    except Exception as e:
+        st.error(f"Error opening incident store: {e}")
+        return
+    total_records = data_version[0]
     
-    # Load threat data with file modification time for automatic cache busting
-    threat_df = load_threat_data_cached(THREAT_DATA_FILE, st.session_state.threat_data_cache_key, file_mod_time)
+    # Tail-load only the incidents written since the last rerun
+    incident_frame = get_incident_frame()
+    new_records = incident_frame.refresh()
     
     # Show data loading status
     current_time = datetime.now().strftime("%H:%M:%S")
-    if not threat_df.empty:
-        st.success(f"📊 Loaded {len(threat_df)} threat records at {current_time}")
+    if total_records:
+        memory_kb = incident_frame.memory_usage_bytes() / 1024
+        st.success(
+            f"📊 {total_records} threat records in store at {current_time} "
+            f"({new_records} new, {memory_kb:,.1f} KB in memory)"
+        )
     else:
         st.warning(f"⚠️ No threat data available (checked at {current_time})")
     
-    if not threat_df.empty:
+    if total_records:
         # --- 3. Filtered List View ---
         st.header("Filtered Threat List")
         
-        # Get unique categories and sort them
-        categories = ['All'] + sorted(threat_df['threat_category'].unique().tolist())
+        # Categories and date bounds come straight from the indexes
+        categories = ['All'] + incident_store_util.get_categories()
         selected_category = st.selectbox("Filter by Threat Category", categories)
 
         # Date range slider
-        min_date = threat_df['date'].min()
-        max_date = threat_df['date'].max()
+        min_date, max_date = incident_store_util.get_date_bounds()
         
         if min_date and max_date:
             try:
@@ -170,52 +213,72 @@ def display_threat_data_viewer():
             if isinstance(date_range, tuple) and len(date_range) == 2:
                 start_date, end_date = date_range
                 
-                # Filter data
-                filtered_df = threat_df[
-                    (threat_df['date'] >= start_date) &
-                    (threat_df['date'] <= end_date)
-                ].copy()
-
-                if selected_category != 'All':
-                    filtered_df = filtered_df[
-                        filtered_df['threat_category'] == selected_category
-                    ]
+                category_filter = None if selected_category == 'All' else selected_category
+                # Indexed COUNT - the full result set is never loaded
+                total_items = incident_store_util.count_incidents(start_date, end_date, category_filter)
+                st.markdown(f"**Found {total_items} items**")
+                
+                # Sorting and paging happen in SQL, so render time depends on the page size only
+                sort_options = {
+                    "Newest first": ('date', True),
+                    "Oldest first": ('date', False),
+                    "Category": ('threat_category', False),
+                    "IP address": ('ip_address', False),
+                }
+                col_sort, col_size, col_page = st.columns([2, 1, 1])
+                with col_sort:
+                    sort_label = st.selectbox("Sort by", list(sort_options))
+                with col_size:
+                    page_size = st.selectbox("Rows per page", [25, 50, 100], index=1)
+                total_pages = max(1, -(-total_items // page_size))
+                with col_page:
+                    page_number = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+                order_by, descending = sort_options[sort_label]
                 
                 # Select only the required columns for the list view
                 display_cols = ['date', 'threat_category', 'threat_category_value', 'ip_address', 'query']
-                display_df = filtered_df[display_cols]
-                st.markdown(f"**Found {len(filtered_df)} items**")
+                display_df = load_threat_data_cached(
+                    cache_key, data_version, start_date, end_date, category_filter, display_cols,
+                    order_by, descending, page_size, (int(page_number) - 1) * page_size
+                )
+                st.caption(f"Page {int(page_number)} of {total_pages}")
+                st.dataframe(display_df, hide_index=True, use_container_width=True)
                 
-                # Display the data
+                # Bulk export of the whole filtered set, generated only when requested
+                if st.button("Prepare Filtered Threat Data Export (CSV)"):
+                    buffer = io.StringIO()
+                    incident_store_util.export_csv(buffer, start_date, end_date, category_filter)
+                    st.download_button(
+                        "⬇️ Export Filtered Threat Data (CSV)",
+                        data=buffer.getvalue(),
+                        file_name=f"threatData_{start_date}_{end_date}.csv",
+                        mime="text/csv",
+                    )
+                
+                # Display the current page as an expanded list
                 if st.button("Display Filtered Threat Data (Expanded List)"):
                     if not display_df.empty:
-                        # Use markdown to format the data neatly showing the required columns
-                        for _, row in display_df.iterrows():
-                            st.markdown(f"""
-                                **Date:** {row['date']} | **Category:** `{row['threat_category']}` | **Severity:** `{row['threat_category_value']}`
-                                **IP:** `{row['ip_address']}` | **Query:** `{row['query']}`
-
-                                ---
-                            """)
+                        # One markdown block for the page rather than one element per row
+                        st.markdown("\n\n---\n\n".join(
+                            f"**Date:** {row.date} | **Category:** `{row.threat_category}` | **Severity:** `{row.threat_category_value}`  \n"
+                            f"**IP:** `{row.ip_address}` | **Query:** `{row.query}`"
+                            for row in display_df.itertuples(index=False)
+                        ))
                     else:
                         st.info("No data found for the selected filters.")
             else:
                  st.warning("Please select a valid date range.") 
-        # --- 1. Trend Line Chart (Last 7 Days) ---
-        st.header("Threat Trend: Last 7 Days")
+        # --- 1. Trend Line Chart (Last N Days) ---
+        trend_days = st.radio("Trend window", [7, 30, 90], horizontal=True, format_func=lambda days: f"{days} days")
+        st.header(f"Threat Trend: Last {trend_days} Days")
         
-        max_date = threat_df['date'].max()
-        # Calculate the start date for the last 7 days (inclusive of max_date)
-        start_date_7d = max_date - timedelta(days=6)
+        # Calculate the start date for the window (inclusive of max_date)
+        start_date_trend = max_date - timedelta(days=trend_days - 1)
         
-        # Filter for the last 7 days
-        df_7d = threat_df[threat_df['date'] >= start_date_7d].copy()
+        # Daily counts come pre-aggregated from the rollup table
+        df_trend = load_threat_trend_cached(cache_key, data_version, trend_days, max_date)
         
-        if not df_7d.empty:
-            # Group by date and threat_category, then count
-            df_trend = df_7d.groupby(['date', 'threat_category']).size().reset_index(name='count')
-            df_trend['date'] = pd.to_datetime(df_trend['date']) # Convert back to datetime for Altair
-            
+        if not df_trend.empty:
             # Create the Altair chart
             chart = alt.Chart(df_trend).mark_line(point=True).encode(
                 x=alt.X('date', title='Date'),
@@ -223,28 +286,96 @@ def display_threat_data_viewer():
                 color='threat_category',
                 tooltip=['date', 'threat_category', 'count']
             ).properties(
-                title=f"Threat Count by Category ({start_date_7d.isoformat()} to {max_date.isoformat()})"
+                title=f"Threat Count by Category ({start_date_trend.isoformat()} to {max_date.isoformat()})"
             ).interactive()
             
             st.altair_chart(chart, use_container_width=True)
         else:
-            st.info("Not enough data to generate a 7-day trend chart.")
+            st.info(f"Not enough data to generate a {trend_days}-day trend chart.")
         
         st.divider()
 
         # --- 2. Map View ---
         st.header("Geographic Threat Locations")
 
-        # Prepare data for st.map (it requires 'lat' and 'lon' as columns)
-        # Using a small radius to group nearby incidents.
-        st.map(threat_df[['latitude', 'longitude', 'threat_category']].rename(
-            columns={'latitude': 'lat', 'longitude': 'lon'}
-        ), zoom=2)
+        # Incidents are binned on the server into grid cells sized for the zoom level,
+        # so the payload is bounded by the number of cells, not the number of incidents
+        map_zoom = st.slider("Map detail (zoom)", map_util.MIN_ZOOM, map_util.MAX_ZOOM, 2)
+        map_df = load_threat_map_cached(cache_key, data_version, map_zoom)
+        st.caption(f"{int(map_df['count'].sum()) if not map_df.empty else 0} located incidents in {len(map_df)} map cells")
+        st.map(map_df, latitude='lat', longitude='lon', size='size', zoom=map_zoom)
         
         st.divider()
     else:
         st.warning("Threat data is not available.")
 
+# --- Performance View Function ---
+
+def display_performance_view():
+    """Displays per-stage latency and token usage from the trace spans (officer only)."""
+    st.title("⏱️ Performance")
+    
+    # Optional Prometheus endpoint - started at app start when TRACE_METRICS_PORT is set
+    if start_metrics_endpoint() is not None:
+        st.caption(f"Prometheus metrics: http://127.0.0.1:{trace_util.TRACE_METRICS_PORT}/metrics")
+    
+    summary = trace_util.stage_summary()
+    if not summary:
+        st.info("No traced calls yet - chat with the assistant to collect timings.")
+    else:
+        # --- Latency per Stage ---
+        st.header("Latency per Stage")
+        stage_df = pd.DataFrame([
+            {
+                "stage": stage,
+                "calls": stats["count"],
+                "errors": stats["errors"],
+                "p50 (ms)": round(stats["p50_seconds"] * 1000, 1),
+                "p95 (ms)": round(stats["p95_seconds"] * 1000, 1),
+                "max (ms)": round(stats["max_seconds"] * 1000, 1),
+                "prompt tokens": stats["prompt_tokens"],
+                "completion tokens": stats["completion_tokens"],
+            }
+            for stage, stats in summary.items()
+        ])
+        st.dataframe(stage_df, hide_index=True, use_container_width=True)
+        
+        chart_df = stage_df.melt(id_vars='stage', value_vars=['p50 (ms)', 'p95 (ms)'], var_name='percentile', value_name='ms')
+        chart = alt.Chart(chart_df).mark_bar().encode(
+            x=alt.X('ms', title='Duration (ms)'),
+            y=alt.Y('stage', title='Stage', sort='-x'),
+            color='percentile',
+            yOffset='percentile',
+            tooltip=['stage', 'percentile', 'ms']
+        )
+        st.altair_chart(chart, use_container_width=True)
+        
+        # The span buffer is serialised only when requested
+        if st.button("Prepare Span Export (JSONL)"):
+            st.download_button(
+                "⬇️ Export Spans (JSONL)",
+                data=trace_util.spans_to_jsonl(),
+                file_name="trace_spans.jsonl",
+                mime="application/jsonl",
+            )
+        with st.expander("Prometheus text"):
+            st.code(trace_util.prometheus_text(), language="text")
+    
+    st.divider()
+    
+    # --- Caches and Background Writer ---
+    st.header("Caches & Background Writer")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.subheader("Completion cache")
+        st.json(cache_util.get_stats())
+    with col2:
+        st.subheader("Embedding cache")
+        st.json(embedding_cache_util.get_stats())
+    with col3:
+        st.subheader("Incident writer")
+        st.json(incident_util.get_stats())
+
 # --- About Us Page Function ---
 
 def display_about_us():
@@ -387,6 +518,7 @@ with st.sidebar:
     nav_options = {
         "chat": {"label": "💬 Chat Interface", "icon": "🤖"},
         "data": {"label": "🛡️ Threat Data", "icon": "📊"}, 
+        "performance": {"label": "⏱️ Performance", "icon": "📈"},
         "about": {"label": "🏛️ About Us", "icon": "ℹ️"}
     }
     
@@ -398,9 +530,9 @@ with st.sidebar:
             button_style = ""
             
         if st.button(f"{button_style} {view_info['label']}", key=f"nav_{view_key}"):
-            # Check if data view requires login
-            if view_key == "data" and not st.session_state.get("password_correct", False):
-                st.error("Please login to access Threat Data")
+            # Check if data and performance views require login
+            if view_key in ("data", "performance") and not st.session_state.get("password_correct", False):
+                st.error(f"Please login to access {view_info['label'].split(' ', 1)[1]}")
             else:
                 st.session_state.current_view = view_key
                 st.rerun()
@@ -429,7 +561,13 @@ if st.session_state.current_view == "chat":
     # Display chat messages from history
     for message in st.session_state.messages:
         if message["role"] == "assistant":
-            st.chat_message(message["role"]).markdown(message["content"])
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+                if "first_token_seconds" in message:
+                    st.caption(
+                        f"⏱️ First token in {message['first_token_seconds']:.2f}s · "
+                        f"complete in {message['total_seconds']:.2f}s"
+                    )
         else:
             st.chat_message(message["role"]).write(message["content"])
 
@@ -453,6 +591,15 @@ elif st.session_state.current_view == "data":
         st.session_state.current_view = "chat"
         st.rerun()
 
+elif st.session_state.current_view == "performance":
+    # --- Performance View ---
+    if st.session_state.get("password_correct", False):
+        display_performance_view()
+    else:
+        st.error("You must be logged in to view Performance.")
+        st.session_state.current_view = "chat"
+        st.rerun()
+
 elif st.session_state.current_view == "about":
     # --- About Us Page ---
     display_about_us()
\ No newline at end of file
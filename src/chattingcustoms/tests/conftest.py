@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other as `from helper import ...`, so src/chattingcustoms must be importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
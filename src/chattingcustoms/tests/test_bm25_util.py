@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import pytest
+
+from helper import bm25_util
+
+
+@pytest.fixture
+def index(tmp_path):
+    bm25_util.clear(str(tmp_path / "bm25_index.json"))
+    bm25_util.add_documents(
+        ["rules:0", "users:0"],
+        [
+            SimpleNamespace(page_content="Refunds above 100 dollars in 2024 need approval", metadata={}),
+            SimpleNamespace(page_content="User buy033 is registered to mailbox033", metadata={}),
+        ],
+    )
+    yield
+    bm25_util.clear()
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("what is the mailbox of buy033?", ["buy033"]),
+    ("do refunds above 100 in 2024 need approval?", []),
+    ("what is user999?", []),
+])
+def test_exact_id_tokens_only_matches_indexed_alphanumeric_ids(index, query, expected):
+    assert sorted(bm25_util.exact_id_tokens(query)) == expected
+
+
+def test_search_ranks_the_chunk_holding_the_id_first(index):
+    assert bm25_util.search("buy033", k=2)[0][0] == "users:0"
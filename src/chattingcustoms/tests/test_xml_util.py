@@ -0,0 +1,32 @@
+import pytest
+
+from helper import xml_util
+
+
+# Malformed inputs seen in real submissions -> fields the parser must recover
+@pytest.mark.parametrize("text, expected", [
+    ("<cart>handgun></cart>", {"carts": [{"cart": "handgun"}]}),
+    ("<Submissiondate>22</submissionddat><type>a</type", {"submission_date": "22", "type": "a"}),
+    ("<place>A</place><address>10 Changi Road", {"place": "A", "address": "10 Changi Road"}),
+    ("<userid>USER001<type>RETUR", {"user_id": "USER001", "type": "RETUR"}),
+])
+def test_parse_declaration_recovers_malformed_markup(text, expected):
+    declaration = xml_util.parse_declaration(text)
+    assert declaration is not None
+    for attribute, value in expected.items():
+        assert getattr(declaration, attribute) == value
+
+
+@pytest.mark.parametrize("text", [
+    "what does the <type> tag mean?",
+    "is <userid> required?",
+    "how do I fill in the declaration form?",
+])
+def test_parse_declaration_leaves_prose_to_the_llm(text):
+    assert xml_util.parse_declaration(text) is None
+
+
+def test_missing_fields_lists_absent_tags():
+    declaration = xml_util.parse_declaration("<userid>USER001</userid><type>BUY</type>")
+    assert "userid" not in declaration.missing_fields
+    assert "mailboxid" in declaration.missing_fields